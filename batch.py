@@ -0,0 +1,316 @@
+# SPES: Starship Programming Edutainment System --- BATCHED PHYSICS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Optional engine mode which keeps the geometry of every PolygonActor in NumPy
+# arrays, so that one tick moves every actor and rebuilds every shape and
+# bounding box with a handful of array operations.
+#
+# Actors attached to the store keep their normal API - their class is swapped
+# for a subclass whose position, angle, velocity, rotation, shape and bbox are
+# views onto the arrays - so user code like p.move(45, 200) is unchanged.
+#
+# Requires NumPy. Switch it on with:
+#
+#     game.use_batch_physics()
+
+from engine import rotation_cache, sin_cos
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class BatchedView(object):
+    """Mixin which redirects an actor's geometry onto a BatchPhysics store."""
+
+    # no slots of its own, so that an actor's class can be swapped for its
+    # view class and back (_batch and _batch_index are PolygonActor slots)
+    __slots__ = ()
+
+    def _get_position(self):
+        return self._batch.pos_rows[self._batch_index]
+
+    def _get_public_position(self):
+        # a NumPy row, which prints nicely - writing to it writes to the store
+        return self._batch.pos[self._batch_index]
+
+    def _set_position(self, value):
+        p = self._batch.pos_rows[self._batch_index]
+        p[0] = value[0]
+        p[1] = value[1]
+
+    def _get_angle(self):
+        return self._batch.angle_row[self._batch_index]
+
+    def _set_angle(self, value):
+        self._batch.set_angle(self._batch_index, value)
+
+    def _get_velocity(self):
+        return self._batch.vel_row[self._batch_index]
+
+    def _set_velocity(self, value):
+        self._batch.vel_row[self._batch_index] = value
+
+    def _get_rotation(self):
+        return self._batch.rot_row[self._batch_index]
+
+    def _set_rotation(self, value):
+        if value != self._batch.rot_row[self._batch_index]:
+            self._batch.set_rotation(self._batch_index, self.shape_archetype, value)
+
+    def _get_shape(self):
+        if self.shape_dirty:
+            self._update_shape()
+        return self._batch.shape_rows[self._batch_index]
+
+    def _get_bbox(self):
+        if self.shape_dirty:
+            self._update_shape()
+        return self._batch.bbox_rows[self._batch_index]
+
+    def _get_rotated(self):
+        return rotation_cache.get(self.shape_archetype, self.rotation)
+
+    # every batched actor moves each tick, so always redraw...
+    def _get_gui_dirty(self):
+        return True
+
+    def _set_gui_dirty(self, value):
+        pass
+
+    # ...and has moved by its velocity this tick - along the angle it had
+    # when it moved, which bouncing off an edge may since have changed
+    def _get_moved_tick(self):
+        return self.game.tick
+
+    def _get_moved_x(self):
+        return self._batch.moved_rows[self._batch_index][0]
+
+    def _get_moved_y(self):
+        return self._batch.moved_rows[self._batch_index][1]
+
+    def _ignore(self, value):
+        pass
+
+    # engine code reads _position, player code position
+    _position = property(_get_position, _set_position)
+    position = property(_get_public_position, _set_position)
+    angle = property(_get_angle, _set_angle)
+    velocity = property(_get_velocity, _set_velocity)
+    rotation = property(_get_rotation, _set_rotation)
+    shape = property(_get_shape)
+    bbox = property(_get_bbox)
+    rotated = property(_get_rotated)
+    gui_dirty = property(_get_gui_dirty, _set_gui_dirty)
+    moved_tick = property(_get_moved_tick, _ignore)
+    moved_x = property(_get_moved_x, _ignore)
+    moved_y = property(_get_moved_y, _ignore)
+
+    def act(self, gui):
+        # movement and screen edges are done for all actors at once by the game
+        pass
+
+    def _update_shape(self):
+        self.shape_dirty = False
+        i = self._batch_index
+        self._batch.update_rows(i, i + 1)
+
+    def move_by(self, angle, dist):
+        i = self._batch_index
+        batch = self._batch
+        s, c = sin_cos(angle)
+        x = s * dist
+        y = c * dist
+        p = batch.pos_rows[i]
+        p[0] += x
+        p[1] += y
+        moved = batch.moved_rows[i]
+        moved[0] += x
+        moved[1] += y
+        batch.update_rows(i, i + 1)
+
+_view_classes = {}
+
+def view_class(cls):
+    "Returns the batched view subclass for actor class cls."
+    vc = _view_classes.get(cls)
+    if vc is None:
+        # velocity and rotation are kept in the store, not in _velocity and _rotation
+        saved = tuple(name[1:] if name in ('_velocity', '_rotation') else name
+                      for name in cls.saved_attrs)
+        vc = type('Batched' + cls.__name__, (BatchedView, cls),
+                  {'__slots__': (), 'saved_attrs': saved})
+        _view_classes[cls] = vc
+    return vc
+
+class BatchPhysics(object):
+    """Structure-of-arrays store for PolygonActor geometry.
+
+    Row i of each array belongs to actors[i]. Each row keeps its shape rotated
+    about the origin, from the same rotation cache as unbatched actors, with
+    its bounding box after the vertices - so a step only has to add the
+    positions, once, to get every shape and box. Shapes with fewer vertices
+    than the widest archetype are padded by repeating their first vertex.
+
+    Actors read their rows through memoryviews made when the arrays are
+    allocated, which give plain floats without copying anything - so a
+    batched actor's bbox, shape and position are as cheap to read as an
+    unbatched one's.
+    """
+
+    def __init__(self, capacity=64, max_vertices=4):
+        if np is None:
+            raise RuntimeError('batch physics requires numpy')
+        self.actors = []
+        self.count = 0
+        self.capacity = 0
+        self.max_vertices = 0
+        self.pos = np.zeros((0, 2))
+        self.angle = np.zeros(0)
+        # sin and cos of each angle - the direction of travel
+        self.heading = np.zeros((0, 2))
+        self.vel = np.zeros(0)
+        self.rot = np.zeros(0)
+        self.nverts = np.zeros(0, dtype=np.intp)
+        # rotated vertex offsets then box corners, and the same placed at pos
+        self.local = np.zeros((0, 2, 2))
+        self.world = np.zeros((0, 2, 2))
+        # how far each actor moved in the last step, for swept collisions
+        self.moved = np.zeros((0, 2))
+        self._resize(capacity, max_vertices)
+
+    def _resize(self, capacity, max_vertices):
+        """Reallocate the arrays, keeping the rows in use."""
+        n = self.count
+        old_v = self.max_vertices
+
+        def grow(old, shape, dtype=float):
+            new = np.zeros(shape, dtype=dtype)
+            new[:n] = old[:n]
+            return new
+
+        self.pos = grow(self.pos, (capacity, 2))
+        self.angle = grow(self.angle, capacity)
+        self.heading = grow(self.heading, (capacity, 2))
+        self.vel = grow(self.vel, capacity)
+        self.rot = grow(self.rot, capacity)
+        self.nverts = grow(self.nverts, capacity, np.intp)
+        self.moved = grow(self.moved, (capacity, 2))
+        local = np.zeros((capacity, max_vertices + 2, 2))
+        local[:n, :old_v] = self.local[:n, :old_v]
+        # pad the new vertex columns with each row's first vertex
+        if n and max_vertices > old_v:
+            local[:n, old_v:max_vertices] = local[:n, :1]
+        local[:n, max_vertices:] = self.local[:n, old_v:]
+        self.local = local
+        self.world = np.zeros((capacity, max_vertices + 2, 2))
+        self.capacity = capacity
+        self.max_vertices = max_vertices
+        # views of the new arrays, for the actors to read and write through
+        self.angle_row = memoryview(self.angle)
+        self.vel_row = memoryview(self.vel)
+        self.rot_row = memoryview(self.rot)
+        self.pos_rows = [memoryview(row) for row in self.pos]
+        self.moved_rows = [memoryview(row) for row in self.moved]
+        flat = [memoryview(row.reshape(-1)) for row in self.world]
+        box = 2 * max_vertices
+        self.bbox_rows = [row[box:box + 4] for row in flat]
+        self.shape_rows = [self._shape_row(i) for i in range(capacity)]
+        if n:
+            self.update_rows(0, n)
+
+    def _shape_row(self, i):
+        "A view of row i's shape as a flat list of coords, without the padding."
+        return memoryview(self.world[i].reshape(-1))[:2 * int(self.nverts[i])]
+
+    def attach(self, actor):
+        """Move actor's geometry into the store and turn it into a view."""
+        if getattr(actor, '_batch', None) is self:
+            return
+        verts = len(actor.shape_archetype) // 2
+        if self.count == self.capacity or verts > self.max_vertices:
+            self._resize(max(self.capacity * 2, self.count + 1),
+                         max(self.max_vertices, verts))
+        i = self.count
+        self.pos[i] = actor._position[0], actor._position[1]
+        self.vel[i] = actor.velocity
+        self.nverts[i] = verts
+        self.moved[i] = 0
+        self.shape_rows[i] = self._shape_row(i)
+        self.actors.append(actor)
+        self.count += 1
+        self.set_angle(i, actor.angle)
+        self.set_rotation(i, actor.shape_archetype, actor.rotation)
+        actor._batch = self
+        actor._batch_index = i
+        actor.__class__ = view_class(type(actor))
+
+    def detach(self, actor):
+        """Copy actor's geometry back into plain attributes and drop its row."""
+        if getattr(actor, '_batch', None) is not self:
+            return
+        i = actor._batch_index
+        position = actor._position.tolist()
+        angle = actor.angle
+        velocity = actor.velocity
+        rotation = actor.rotation
+        # swap-remove: the last row fills the gap
+        last = self.count - 1
+        if i != last:
+            for arr in (self.pos, self.angle, self.heading, self.vel, self.rot,
+                        self.nverts, self.local, self.world, self.moved):
+                arr[i] = arr[last]
+            self.shape_rows[i] = self._shape_row(i)
+            moved = self.actors[last]
+            self.actors[i] = moved
+            moved._batch_index = i
+        self.actors.pop()
+        self.count -= 1
+        actor.__class__ = type(actor).__bases__[1]
+        del actor._batch
+        del actor._batch_index
+        actor._position = array('d', position)
+        actor.angle = angle
+        actor.velocity = velocity
+        actor._rotation = rotation
+        # shape and bbox are rebuilt from these when next needed
+        actor.shape_dirty = actor.gui_dirty = True
+
+    def detach_all(self):
+        while self.actors:
+            self.detach(self.actors[-1])
+
+    def step(self):
+        """Move every actor by its velocity and rebuild all shapes and boxes."""
+        n = self.count
+        moved = self.moved[:n]
+        np.multiply(self.heading[:n], self.vel[:n, None], out=moved)
+        self.pos[:n] += moved
+        self.update_rows(0, n)
+
+    def set_angle(self, i, degrees):
+        "Point row i in the direction of degrees."
+        self.angle[i] = degrees
+        self.heading[i] = sin_cos(degrees)
+
+    def set_rotation(self, i, archetype, degrees):
+        """Turn row i, whose shape archetype is given, to degrees."""
+        rotated = rotation_cache.get(archetype, degrees)
+        verts = len(archetype) // 2
+        local = self.local[i]
+        local[:verts] = np.asarray(rotated.offsets).reshape(verts, 2)
+        local[verts:self.max_vertices] = local[0]
+        local[self.max_vertices:] = np.asarray(rotated.box).reshape(2, 2)
+        self.rot[i] = degrees
+        self.update_rows(i, i + 1)
+
+    def update_rows(self, lo, hi):
+        """Rebuild shape and bounding box for rows lo to hi (exclusive)."""
+        np.add(self.local[lo:hi], self.pos[lo:hi, None, :], out=self.world[lo:hi])
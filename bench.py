@@ -0,0 +1,384 @@
+# SPES: Starship Programming Edutainment System --- BENCHMARKS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Measures how fast the game engine runs without a display.
+#
+# The suite times some hot functions on their own (micro benchmarks) and whole
+# ticks of some typical game situations (scenarios), and compares the results
+# with a stored baseline to catch regressions:
+#
+#     $ python bench.py                  # run the suite, compare with bench_baseline.json
+#     $ python bench.py --save           # run the suite and make it the new baseline
+#     $ python bench.py --sweep          # actor count sweeps for broadphase and batch physics
+#     $ python bench.py --tunnelling     # head-on bullets caught by each broadphase
+#
+# Baselines are only comparable on the same machine - re-save after moving.
+
+from engine import Game, Bullet, Ship, rotate_vertex
+from headless import HeadlessGUI
+from renderer import Framebuffer
+from snapshot import Snapshot
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from time import perf_counter
+
+BASELINE = 'bench_baseline.json'
+
+def make_game(gui, num_bullets, broadphase):
+    """Make a game with num_bullets flying around in random directions."""
+    game = Game()
+    game.broadphase = broadphase
+    game.setup(gui)
+    for i in range(num_bullets):
+        x = random.randint(0, gui.get_width())
+        y = random.randint(0, gui.get_height())
+        game.add_actor(Bullet(game, x, y, random.randint(0, 359), game.player))
+    return game
+
+def bench_collisions(counts=(10, 100, 500, 1000, 2000), ticks=20):
+    """Print ticks per second for each broadphase as the actor count grows."""
+    gui = HeadlessGUI(2000, 2000)
+    print('{:>8} {:>14} {:>14} {:>14}'.format('actors', 'brute ticks/s', 'grid ticks/s',
+                                              'sap ticks/s'))
+    for n in counts:
+        results = []
+        for broadphase in ('brute', 'grid', 'sap'):
+            random.seed(n)
+            game = make_game(gui, n, broadphase)
+            game.iterate_loop(gui)
+            start = perf_counter()
+            for i in range(ticks):
+                game.iterate_loop(gui)
+            results.append(ticks / (perf_counter() - start))
+        print('{:>8} {:>14.1f} {:>14.1f} {:>14.1f}'.format(n, *results))
+
+def bench_physics(counts=(10, 100, 1000, 2000), ticks=20):
+    """Print ticks per second with and without NumPy batched physics."""
+    try:
+        import numpy
+    except ImportError:
+        print('numpy not installed - skipping batch physics benchmark')
+        return
+    gui = HeadlessGUI(2000, 2000)
+    print('{:>8} {:>14} {:>14}'.format('actors', 'plain ticks/s', 'batch ticks/s'))
+    for n in counts:
+        results = []
+        for batched in (False, True):
+            random.seed(n)
+            game = make_game(gui, n, 'grid')
+            game.iterate_loop(gui)
+            game.use_batch_physics(batched)
+            start = perf_counter()
+            for i in range(ticks):
+                game.iterate_loop(gui)
+            results.append(ticks / (perf_counter() - start))
+        print('{:>8} {:>14.1f} {:>14.1f}'.format(n, results[0], results[1]))
+
+def bench_tunnelling(pairs=20, ticks=40):
+    """Print how many head-on bullet collisions each broadphase catches.
+
+    Bullets close on each other by 20 pixels a tick but are only 6 wide, so
+    unless a broadphase allows for the ground covered between ticks, most
+    pairs pass clean through each other. The gaps between pairs go up by
+    a pixel each, so every way of lining up is tried once.
+    """
+    gui = HeadlessGUI(2000, 2000)
+    print('{:>10} {:>8}'.format('broadphase', 'caught'))
+    for broadphase in ('brute', 'grid', 'sap'):
+        game = Game(seed=0)
+        game.broadphase = broadphase
+        game.num_drones = 0
+        game.player.quiet_mode = True
+        game.setup(gui)
+        game.player.place(1000, 1900)
+        shots = []
+        for i in range(pairs):
+            y = 100 + i * 50
+            # bullets start 30 pixels in front of where they are fired from
+            a = Bullet(game, 100, y, 90, game.player)
+            b = Bullet(game, 100 + 400 + i, y, 270, game.player)
+            game.add_actor(a)
+            game.add_actor(b)
+            shots.append((a, b))
+        for i in range(ticks):
+            game.iterate_loop(gui)
+        caught = sum(1 for a, b in shots if a.dying or not a.is_live)
+        print('{:>10} {:>8}'.format(broadphase, '{}/{}'.format(caught, pairs)))
+
+############################## SCENARIOS #############################
+
+def scenario_game(num_bullets=0, seed=0):
+    """A quiet game on a big arena with num_bullets flying around."""
+    gui = HeadlessGUI(2000, 2000)
+    game = Game(seed=seed)
+    game.player.quiet_mode = True
+    game.setup(gui)
+    rng = game.random
+    for i in range(num_bullets):
+        x = rng.randint(0, gui.get_width())
+        y = rng.randint(0, gui.get_height())
+        game.add_actor(Bullet(game, x, y, rng.randint(0, 359), game.player))
+    # let everything be added before measuring
+    game.iterate_loop(gui)
+    return game, gui
+
+def idle():
+    return scenario_game(), None
+
+def bullets(n):
+    return lambda: (scenario_game(n), None)
+
+def laser_storm():
+    """A ring of lasers fired every tick, through a crowd of bullets."""
+    game, gui = scenario_game(500)
+    p = game.player
+    p.place(1000, 1000)
+
+    def each_tick():
+        for angle in range(0, 360, 10):
+            p.laser(angle)
+    return (game, gui), each_tick
+
+def parked_ships():
+    """A thousand ships standing still, with a hundred bullets flying among them."""
+    game, gui = scenario_game(100)
+    # in rows, so that none of them start off touching
+    for i in range(1000):
+        ship = Ship(game, 'grey')
+        ship.place(40 + i % 32 * 60, 40 + i // 32 * 60)
+        game.add_actor(ship)
+    game.iterate_loop(gui)
+    return (game, gui), None
+
+def mass_death():
+    """A thousand bullets which all die at once - measures dying and clean up."""
+    game, gui = scenario_game(1000)
+    for a in game.actors.of_kind('bullet'):
+        a.die()
+    return (game, gui), None
+
+def spawn_burst():
+    """Two thousand bullets swapped for two thousand new ones, at random places,
+    every tick - measures a crowd arriving all at once."""
+    game, gui = scenario_game()
+    rng = game.random
+    burst = []
+
+    def each_tick():
+        for a in burst:
+            a.is_live = False
+        burst[:] = [game.make_projectile(Bullet, rng.randint(0, gui.get_width()),
+                                         rng.randint(0, gui.get_height()),
+                                         rng.randint(0, 359), game.player)
+                    for i in range(2000)]
+        for a in burst:
+            game.add_actor(a)
+    return (game, gui), each_tick
+
+# name -> (setup function, ticks to run)
+SCENARIOS = [
+    ('idle', idle, 500),
+    ('bullets_100', bullets(100), 200),
+    ('bullets_1k', bullets(1000), 30),
+    ('bullets_10k', bullets(10000), 3),
+    ('laser_storm', laser_storm, 30),
+    ('parked_ships', parked_ships, 30),
+    ('mass_death', mass_death, 25),
+    ('spawn_burst', spawn_burst, 10),
+]
+
+def _run_ticks(game, gui, each_tick, ticks):
+    for i in range(ticks):
+        if each_tick:
+            each_tick()
+        game.iterate_loop(gui)
+
+def run_scenario(setup, ticks):
+    """Returns ticks per second and peak KiB allocated per tick for a scenario.
+
+    Each is measured on a fresh game, since tracing allocations is slow.
+    """
+    (game, gui), each_tick = setup()
+    start = perf_counter()
+    _run_ticks(game, gui, each_tick, ticks)
+    elapsed = perf_counter() - start
+
+    (game, gui), each_tick = setup()
+    tracemalloc.start()
+    total = 0
+    for i in range(ticks):
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        _run_ticks(game, gui, each_tick, 1)
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {'ticks_per_second': ticks / elapsed,
+            'alloc_kib_per_tick': total / ticks / 1024}
+
+########################## MICRO BENCHMARKS ##########################
+
+def micro_rotate_vertex():
+    return lambda: rotate_vertex(10, 20, 0, 0, 33)
+
+def micro_update_shape():
+    game, gui = scenario_game()
+    p = game.player
+    return p._update_shape
+
+def micro_update_shape_odd_angle():
+    """An angle which is not a whole degree, so misses the rotation tables."""
+    game, gui = scenario_game()
+    p = game.player
+    angles = [a + 0.5 for a in range(360)]
+
+    def call():
+        p._rotation = angles[game.tick % 360]
+        game.tick += 1
+        p._update_shape()
+    return call
+
+def micro_collisions():
+    game, gui = scenario_game(1000)
+    return game.collisions
+
+def micro_garbage_collection():
+    """Scanning 1000 live actors for dead ones - the common case."""
+    game, gui = scenario_game(1000)
+    return lambda: game.garbage_collection(gui)
+
+def micro_rasterise():
+    """Filling 1000 actors into a plain framebuffer - the raster renderer without Tk."""
+    game, gui = scenario_game(1000)
+    fb = Framebuffer(gui.get_width(), gui.get_height(), (0, 0, 255))
+    white = (255, 255, 255)
+
+    def call():
+        fb.clear()
+        for a in game.actors:
+            fb.polygon(a.shape, white)
+    return call
+
+def micro_snapshot():
+    """Snapshotting 1000 actors, as the game does every Game.snapshot_every ticks."""
+    game, gui = scenario_game(1000)
+    return lambda: Snapshot(game)
+
+# name -> (setup function returning the callable to time, calls per repeat)
+MICROS = [
+    ('rotate_vertex', micro_rotate_vertex, 100000),
+    ('update_shape', micro_update_shape, 20000),
+    ('update_shape_odd_angle', micro_update_shape_odd_angle, 20000),
+    ('collisions_1k', micro_collisions, 20),
+    ('garbage_collection_1k', micro_garbage_collection, 200),
+    ('rasterise_1k', micro_rasterise, 20),
+    ('snapshot_1k', micro_snapshot, 200),
+]
+
+def run_micro(setup, number, repeat=5):
+    """Returns the best of repeat timings, in microseconds per call."""
+    func = setup()
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return {'usec_per_call': best / number * 1e6}
+
+############################# THE SUITE ##############################
+
+def run_suite(only=None):
+    results = {'micro': {}, 'scenarios': {}}
+    for name, setup, number in MICROS:
+        if only is None or name in only:
+            results['micro'][name] = run_micro(setup, number)
+    for name, setup, ticks in SCENARIOS:
+        if only is None or name in only:
+            results['scenarios'][name] = run_scenario(setup, ticks)
+    return results
+
+def compare(results, baseline, tolerance=0.2):
+    """Returns a list of regressions - results more than tolerance worse than baseline."""
+    regressions = []
+    for name, r in results['micro'].items():
+        old = baseline.get('micro', {}).get(name)
+        if old and r['usec_per_call'] > old['usec_per_call'] * (1 + tolerance):
+            regressions.append('{}: {:.2f}us per call, was {:.2f}us'.format(
+                name, r['usec_per_call'], old['usec_per_call']))
+    for name, r in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old and r['ticks_per_second'] < old['ticks_per_second'] * (1 - tolerance):
+            regressions.append('{}: {:.1f} ticks/s, was {:.1f}'.format(
+                name, r['ticks_per_second'], old['ticks_per_second']))
+    return regressions
+
+def print_results(results, baseline=None):
+    baseline = baseline or {}
+
+    def was(section, name, key, fmt):
+        old = baseline.get(section, {}).get(name)
+        return fmt.format(old[key]) if old else '{:>12}'.format('-')
+
+    print('{:<26}{:>12}{:>12}'.format('micro', 'us/call', 'baseline'))
+    for name, r in results['micro'].items():
+        print('{:<26}{:>12.2f}{}'.format(name, r['usec_per_call'],
+                                        was('micro', name, 'usec_per_call', '{:>12.2f}')))
+    print()
+    print('{:<26}{:>12}{:>12}{:>14}'.format('scenario', 'ticks/s', 'baseline', 'KiB/tick'))
+    for name, r in results['scenarios'].items():
+        print('{:<26}{:>12.1f}{}{:>14.1f}'.format(name, r['ticks_per_second'],
+                                                 was('scenarios', name, 'ticks_per_second', '{:>12.1f}'),
+                                                 r['alloc_kib_per_tick']))
+
+###################### TOP LEVEL USER INTERFACE ######################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the SPES engine.')
+    parser.add_argument('names', nargs='*', help='only run these benchmarks')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='save results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction slower than baseline counted as a regression')
+    parser.add_argument('--sweep', action='store_true',
+                        help='run the actor count sweeps instead')
+    parser.add_argument('--tunnelling', action='store_true',
+                        help='count head-on bullet collisions caught by each broadphase instead')
+    args = parser.parse_args()
+
+    if args.sweep:
+        bench_collisions()
+        print()
+        bench_physics()
+        sys.exit()
+    if args.tunnelling:
+        bench_tunnelling()
+        sys.exit()
+
+    results = run_suite(args.names or None)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.save:
+        # saving some benchmarks only replaces those in the baseline
+        for section in results:
+            baseline.setdefault(section, {}).update(results[section])
+            results[section] = baseline[section]
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('\nbaseline saved to {}'.format(args.baseline))
+    elif baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('\nREGRESSIONS:')
+            for r in regressions:
+                print('  ' + r)
+            sys.exit(1)
+        print('\nno regressions against {}'.format(args.baseline))
@@ -0,0 +1,497 @@
+# SPES: Starship Programming Edutainment System --- COLLISION HELPERS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Broadphase structures used by engine.Game to find pairs of actors which
+# might be touching, without testing every actor against every other actor,
+# plus the geometry tests used once a pair has been found.
+#
+# Everything here works on plain bounding boxes in the engine's format:
+#
+#     [xmin, ymin, xmax, ymax]
+#
+# and flat shape lists: [x1, y1, x2, y2, ...]
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+######################### UTILITY FUNCTIONS ##########################
+
+def boxes_overlap(ba, bb):
+    "Returns True if two bounding boxes overlap (touching counts as overlapping)."
+    return ba[0] <= bb[2] and bb[0] <= ba[2] and ba[1] <= bb[3] and bb[1] <= ba[3]
+
+def swept_box(box, dx, dy, out):
+    """Fill out with the box covering all the space box passed through to get
+    where it is by a straight move of (dx, dy). Returns out."""
+    if dx < 0:
+        out[0] = box[0]
+        out[2] = box[2] - dx
+    else:
+        out[0] = box[0] - dx
+        out[2] = box[2]
+    if dy < 0:
+        out[1] = box[1]
+        out[3] = box[3] - dy
+    else:
+        out[1] = box[1] - dy
+        out[3] = box[3]
+    return out
+
+def convex_hull(points):
+    "Returns the convex hull of a flat list of points, anticlockwise, as a flat list."
+    pts = sorted(set(zip(points[0::2], points[1::2])))
+    if len(pts) < 3:
+        return [c for p in pts for c in p]
+    # Andrew's monotone chain
+    def half(points):
+        chain = []
+        for p in points:
+            while len(chain) >= 2 and _orientation(chain[-2][0], chain[-2][1],
+                                                   chain[-1][0], chain[-1][1],
+                                                   p[0], p[1]) <= 0:
+                chain.pop()
+            chain.append(p)
+        return chain[:-1]
+    hull = half(pts) + half(reversed(pts))
+    return [c for p in hull for c in p]
+
+def hull_axes(hull):
+    """Returns the separating axes for a convex hull, for convex_shapes_overlap().
+
+    Each axis is (nx, ny, lo, hi) - a unit edge normal and the range of the
+    hull's projection onto it. Parallel edges share one axis.
+    """
+    axes = []
+    seen = set()
+    n = len(hull)
+    for i in range(0, n, 2):
+        ex = hull[(i + 2) % n] - hull[i]
+        ey = hull[(i + 3) % n] - hull[i + 1]
+        length = (ex * ex + ey * ey) ** 0.5
+        if length == 0:
+            continue
+        nx = -ey / length
+        ny = ex / length
+        # opposite normals give the same axis
+        if nx < 0 or (nx == 0 and ny < 0):
+            nx = -nx
+            ny = -ny
+        key = (round(nx, 9), round(ny, 9))
+        if key in seen:
+            continue
+        seen.add(key)
+        projections = [hull[j] * nx + hull[j + 1] * ny for j in range(0, n, 2)]
+        axes.append((nx, ny, min(projections), max(projections)))
+    return axes
+
+def _separated(axes, px, py, hull, qx, qy):
+    "True if one of axes (of a hull at p) separates it from hull (at q)."
+    dx = qx - px
+    dy = qy - py
+    n = len(hull)
+    for nx, ny, lo, hi in axes:
+        shift = dx * nx + dy * ny
+        low = high = hull[0] * nx + hull[1] * ny
+        for i in range(2, n, 2):
+            d = hull[i] * nx + hull[i + 1] * ny
+            if d < low:
+                low = d
+            elif d > high:
+                high = d
+        if low + shift > hi or high + shift < lo:
+            return True
+    return False
+
+def convex_shapes_overlap(hull_a, axes_a, ax, ay, hull_b, axes_b, bx, by):
+    """Separating axis test for two convex hulls positioned at (ax, ay) and (bx, by).
+
+    Hulls are flat lists of vertex offsets from their position, and axes come
+    from hull_axes(). Touching counts as overlapping.
+    """
+    return not (_separated(axes_a, ax, ay, hull_b, bx, by)
+                or _separated(axes_b, bx, by, hull_a, ax, ay))
+
+def convex_shapes_sweep(hull_a, axes_a, ax, ay, hull_b, axes_b, bx, by, dx, dy):
+    """Separating axis test for hull a, starting at (ax, ay) and moving by
+    (dx, dy), against hull b standing at (bx, by).
+
+    Returns the fraction of the move at which they first touch, or None if
+    they don't touch at any point of it. For two moving hulls, give a's
+    motion relative to b's.
+    """
+    t0 = 0.0
+    t1 = 1.0
+    for axes, own, other in ((axes_a, True, hull_b), (axes_b, False, hull_a)):
+        n = len(other)
+        for nx, ny, lo, hi in axes:
+            low = high = other[0] * nx + other[1] * ny
+            for i in range(2, n, 2):
+                d = other[i] * nx + other[i + 1] * ny
+                if d < low:
+                    low = d
+                elif d > high:
+                    high = d
+            if own:
+                a_lo, a_hi, b_lo, b_hi = lo, hi, low, high
+            else:
+                a_lo, a_hi, b_lo, b_hi = low, high, lo, hi
+            # a's projection at time t is shifted by shift + v * t from b's
+            shift = (ax - bx) * nx + (ay - by) * ny
+            v = dx * nx + dy * ny
+            # they overlap on this axis while leading <= v * t <= trailing
+            trailing = b_hi - a_lo - shift
+            leading = b_lo - a_hi - shift
+            if v == 0:
+                if trailing < 0 or leading > 0:
+                    return None
+            elif v > 0:
+                t0 = max(t0, leading / v)
+                t1 = min(t1, trailing / v)
+            else:
+                t0 = max(t0, trailing / v)
+                t1 = min(t1, leading / v)
+            if t0 > t1:
+                return None
+    return t0
+
+def segment_hits_box(x0, y0, x1, y1, box):
+    "Returns True if the line segment (x0, y0)-(x1, y1) touches the box."
+    # Liang-Barsky: clip the segment's parameter range against each side
+    dx = x1 - x0
+    dy = y1 - y0
+    t0 = 0.0
+    t1 = 1.0
+    for p, q in ((-dx, x0 - box[0]), (dx, box[2] - x0),
+                 (-dy, y0 - box[1]), (dy, box[3] - y0)):
+        if p == 0:
+            # parallel to this side, and outside it
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    return False
+                if t > t0:
+                    t0 = t
+            else:
+                if t < t0:
+                    return False
+                if t < t1:
+                    t1 = t
+    return True
+
+def _orientation(ax, ay, bx, by, cx, cy):
+    "Positive if a, b, c turn anticlockwise, negative if clockwise, 0 if in line."
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+def segments_intersect(ax, ay, bx, by, cx, cy, dx, dy):
+    "Returns True if segment a-b touches segment c-d."
+    d1 = _orientation(cx, cy, dx, dy, ax, ay)
+    d2 = _orientation(cx, cy, dx, dy, bx, by)
+    d3 = _orientation(ax, ay, bx, by, cx, cy)
+    d4 = _orientation(ax, ay, bx, by, dx, dy)
+    if ((d1 > 0 and d2 < 0) or (d1 < 0 and d2 > 0)) \
+       and ((d3 > 0 and d4 < 0) or (d3 < 0 and d4 > 0)):
+        return True
+    # touching or in line - check for overlap of the collinear points
+    def on_segment(px, py, qx, qy, rx, ry):
+        return min(px, qx) <= rx <= max(px, qx) and min(py, qy) <= ry <= max(py, qy)
+    return ((d1 == 0 and on_segment(cx, cy, dx, dy, ax, ay))
+            or (d2 == 0 and on_segment(cx, cy, dx, dy, bx, by))
+            or (d3 == 0 and on_segment(ax, ay, bx, by, cx, cy))
+            or (d4 == 0 and on_segment(ax, ay, bx, by, dx, dy)))
+
+def point_in_polygon(x, y, shape):
+    "Returns True if (x, y) is inside the polygon (even-odd rule)."
+    inside = False
+    n = len(shape)
+    jx = shape[n - 2]
+    jy = shape[n - 1]
+    for i in range(0, n, 2):
+        ix = shape[i]
+        iy = shape[i + 1]
+        if (iy > y) != (jy > y) and x < (jx - ix) * (y - iy) / (jy - iy) + ix:
+            inside = not inside
+        jx = ix
+        jy = iy
+    return inside
+
+def segment_hits_polygon(x0, y0, x1, y1, shape):
+    "Returns True if the line segment touches the polygon."
+    if point_in_polygon(x0, y0, shape):
+        return True
+    n = len(shape)
+    jx = shape[n - 2]
+    jy = shape[n - 1]
+    for i in range(0, n, 2):
+        ix = shape[i]
+        iy = shape[i + 1]
+        if segments_intersect(x0, y0, x1, y1, jx, jy, ix, iy):
+            return True
+        jx = ix
+        jy = iy
+    return False
+
+############################ BROADPHASE ##############################
+
+class SpatialHash(object):
+    """Uniform grid broadphase.
+
+    Each actor is filed under every grid cell which its bounding box touches.
+    Only actors sharing a cell are reported as candidate pairs, and each
+    unordered pair is reported once, however many cells the two share.
+
+    Rebuild with the current actors once per tick, then iterate over
+    candidate_pairs().
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def rebuild(self, actors):
+        """Clear the grid and file each actor which has a bounding box."""
+        self.cells = {}
+        cells = self.cells
+        size = self.cell_size
+        for a in actors:
+            box = a.bbox
+            if not box:
+                continue
+            x0 = int(box[0] // size)
+            x1 = int(box[2] // size)
+            y0 = int(box[1] // size)
+            y1 = int(box[3] // size)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    key = (cx, cy)
+                    bucket = cells.get(key)
+                    if bucket is None:
+                        cells[key] = [a]
+                    else:
+                        bucket.append(a)
+
+    def _cell_range(self, box):
+        size = self.cell_size
+        return (int(box[0] // size), int(box[1] // size),
+                int(box[2] // size), int(box[3] // size))
+
+    def insert(self, actor):
+        """File one more actor, without rebuilding."""
+        box = actor.bbox
+        if not box:
+            return
+        x0, y0, x1, y1 = self._cell_range(box)
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cells.setdefault((cx, cy), []).append(actor)
+
+    def remove(self, actor):
+        """Unfile an actor - its bounding box must not have changed since insert()."""
+        box = actor.bbox
+        if not box:
+            return
+        x0, y0, x1, y1 = self._cell_range(box)
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket and actor in bucket:
+                    bucket.remove(actor)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def candidate_pairs(self):
+        """Yield each unordered pair of actors whose bounding boxes overlap.
+
+        A pair sharing several cells is only reported from the cell which
+        holds the top-left corner of the overlapping region, so no set of
+        already-seen pairs is needed.
+        """
+        size = self.cell_size
+        for (cx, cy), bucket in self.cells.items():
+            n = len(bucket)
+            if n < 2:
+                continue
+            for i in range(n - 1):
+                a = bucket[i]
+                ba = a.bbox
+                for j in range(i + 1, n):
+                    b = bucket[j]
+                    bb = b.bbox
+                    if not boxes_overlap(ba, bb):
+                        continue
+                    # only report from the cell owning the overlap's corner
+                    if (int(max(ba[0], bb[0]) // size) == cx
+                        and int(max(ba[1], bb[1]) // size) == cy):
+                        yield a, b
+
+    def pairs_with(self, actors, boxes=None):
+        """Yield (a, b) for each of actors and each actor b in the grid whose
+        bounding boxes overlap - each pair once. actors need not be in the grid.
+
+        boxes: optional dict of actor -> box to use for actors instead of bbox
+        """
+        cells = self.cells
+        if not cells:
+            return
+        size = self.cell_size
+        for a in actors:
+            ba = boxes[a] if boxes else a.bbox
+            if not ba:
+                continue
+            x0, y0, x1, y1 = self._cell_range(ba)
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    bucket = cells.get((cx, cy))
+                    if not bucket:
+                        continue
+                    for b in bucket:
+                        bb = b.bbox
+                        if not boxes_overlap(ba, bb):
+                            continue
+                        # only report from the cell owning the overlap's corner
+                        if (int(max(ba[0], bb[0]) // size) == cx
+                            and int(max(ba[1], bb[1]) // size) == cy):
+                            yield a, b
+
+    def cells_on_segment(self, x0, y0, x1, y1):
+        """Yield the keys of the cells which the segment passes through, in order.
+
+        Uses a DDA grid traversal, stepping to whichever cell boundary the
+        segment reaches next.
+        """
+        size = self.cell_size
+        cx = int(x0 // size)
+        cy = int(y0 // size)
+        dx = x1 - x0
+        dy = y1 - y0
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # t is the fraction of the way along the segment
+        if dx:
+            t_max_x = ((cx + (step_x > 0)) * size - x0) / dx
+            t_delta_x = size / abs(dx)
+        else:
+            t_max_x = t_delta_x = float('inf')
+        if dy:
+            t_max_y = ((cy + (step_y > 0)) * size - y0) / dy
+            t_delta_y = size / abs(dy)
+        else:
+            t_max_y = t_delta_y = float('inf')
+        yield (cx, cy)
+        for i in range(abs(int(x1 // size) - cx) + abs(int(y1 // size) - cy)):
+            if t_max_x < t_max_y:
+                cx += step_x
+                t_max_x += t_delta_x
+            else:
+                cy += step_y
+                t_max_y += t_delta_y
+            yield (cx, cy)
+
+    def query_segment(self, x0, y0, x1, y1):
+        """Yield each actor whose bounding box the segment touches, once."""
+        cells = self.cells
+        seen = set()
+        for key in self.cells_on_segment(x0, y0, x1, y1):
+            bucket = cells.get(key)
+            if not bucket:
+                continue
+            for a in bucket:
+                if id(a) not in seen:
+                    seen.add(id(a))
+                    if segment_hits_box(x0, y0, x1, y1, a.bbox):
+                        yield a
+
+class SweepAndPrune(object):
+    """Sort and sweep broadphase.
+
+    Actors are kept sorted on the left edge of their boxes from one tick to
+    the next. Things only move a little each tick, so the order hardly
+    changes - Python's sort finds the runs still in order and puts it right
+    in close to linear time, while a crowd of newcomers costs no more than
+    sorting them from scratch. Overlapping pairs are then found in one sweep
+    along the x axis.
+
+    Call update() once per tick with the box to use for each actor (e.g. a
+    swept box), then iterate over candidate_pairs().
+    """
+
+    def __init__(self):
+        # parallel lists, in order of box left edge
+        self.actors = []
+        self.boxes = []
+        self.keys = []
+        self.members = {}
+        # reusable box buffers, by actor
+        self.buffers = {}
+        # widest box - found when first needed for query_box()
+        self.max_width = None
+
+    def buffer(self, actor):
+        """Returns a 4 element array which the caller may fill with actor's box
+        for this tick, saving a new box every tick."""
+        buf = self.buffers.get(actor)
+        if buf is None:
+            buf = self.buffers[actor] = array('d', (0.0, 0.0, 0.0, 0.0))
+        return buf
+
+    def update(self, boxes):
+        """boxes: dict of actor -> box, for every actor to include this tick."""
+        actors = self.actors
+        members = self.members
+        if len(actors) != len(boxes) or not all(a in boxes for a in actors):
+            for a in actors:
+                if a not in boxes:
+                    self.buffers.pop(a, None)
+            actors = [a for a in actors if a in boxes]
+            actors.extend(a for a in boxes if a not in members)
+        box_list = [boxes[a] for a in actors]
+        keys = [b[0] for b in box_list]
+        # the sort is stable, so equal left edges keep last tick's order
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.actors = [actors[i] for i in order]
+        self.boxes = [box_list[i] for i in order]
+        self.keys = [keys[i] for i in order]
+        self.members = boxes
+        self.max_width = None
+
+    def candidate_pairs(self):
+        """Yield each unordered pair of actors whose boxes overlap, once."""
+        actors = self.actors
+        boxes = self.boxes
+        n = len(actors)
+        for i in range(n - 1):
+            ba = boxes[i]
+            right = ba[2]
+            j = i + 1
+            # everything further along starts to the right of this one's left edge
+            while j < n:
+                bb = boxes[j]
+                if bb[0] > right:
+                    break
+                if ba[1] <= bb[3] and bb[1] <= ba[3]:
+                    yield actors[i], actors[j]
+                j += 1
+
+    def query_box(self, box):
+        """Yield each actor whose box overlaps box."""
+        boxes = self.boxes
+        if self.max_width is None:
+            self.max_width = max([b[2] - b[0] for b in boxes], default=0.0)
+        keys = self.keys
+        # only boxes starting within the widest width to the left can reach
+        lo = bisect_left(keys, box[0] - self.max_width)
+        hi = bisect_right(keys, box[2])
+        actors = self.actors
+        for i in range(lo, hi):
+            b = boxes[i]
+            if b[2] >= box[0] and b[1] <= box[3] and box[1] <= b[3]:
+                yield actors[i]
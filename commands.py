@@ -0,0 +1,160 @@
+# SPES: Starship Programming Edutainment System --- COMMAND QUEUE
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Passes ship commands from other threads to the game loop.
+#
+# In the command line frontend the game runs on the Tk thread while the player
+# types at the interpreter on the main thread. With a CommandQueue installed
+# on the game, a command like p.move(45, 200) called from any thread but the
+# game's is not run there and then - it is queued, and the game loop runs all
+# queued commands together at the start of the next tick.
+#
+# The call returns a Pending object straight away, which can be waited for:
+#
+#     p.move(90, 200).wait()
+#
+# or awaited in asyncio code - for a move, it is done when the ship stops:
+#
+#     async def square():
+#         for angle in (0, 90, 180, 270):
+#             await p.move(angle, 100)
+#
+#     spawn(square())
+
+import asyncio
+import threading
+import traceback
+from collections import deque
+
+class Pending(object):
+    """The outcome of a queued command.
+
+    Done when the command has run - or, if the command started something
+    which finishes later (it returned an object with add_done_callback, like a
+    Job), when that has finished.
+    """
+
+    def __init__(self, description):
+        self.description = description
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def __repr__(self):
+        state = 'done' if self.done() else 'pending'
+        return '<{} {}>'.format(state, self.description)
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until done, then return the command's result (or raise its error)."""
+        if not self._done.wait(timeout):
+            raise TimeoutError('{} not done after {}s'.format(self.description, timeout))
+        if self.error:
+            raise self.error
+        return self.result
+
+    def add_done_callback(self, fn):
+        "Call fn() when done - straight away if already done."
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def apply(self, result):
+        """Called by the game loop with the command's return value."""
+        if hasattr(result, 'add_done_callback'):
+            result.add_done_callback(lambda: self._finish(result, None))
+        else:
+            self._finish(result, None)
+
+    def fail(self, error):
+        self._finish(None, error)
+
+    def _finish(self, result, error):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for fn in callbacks:
+            fn()
+
+    def __await__(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                if self.error:
+                    future.set_exception(self.error)
+                else:
+                    future.set_result(self.result)
+
+        self.add_done_callback(lambda: loop.call_soon_threadsafe(resolve))
+        return future.__await__()
+
+class CommandQueue(object):
+    """Commands waiting for the game loop, from threads other than the game's.
+
+    Uses a deque, whose append and popleft are atomic, so neither side ever
+    waits on a lock.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.game_thread = None
+
+    def claim(self):
+        "Call from the thread which runs the game loop."
+        self.game_thread = threading.get_ident()
+
+    def on_game_thread(self):
+        return threading.get_ident() == self.game_thread
+
+    def put(self, actor, func, args):
+        """Queue func(actor, *args) for the game loop, and return its Pending."""
+        pending = Pending('{}({})'.format(func.__name__, ', '.join(map(repr, args))))
+        self.queue.append((pending, actor, func, args))
+        return pending
+
+    def drain(self):
+        """Run the commands queued so far. Returns the number run."""
+        queue = self.queue
+        # anything queued while draining waits for the next tick
+        n = len(queue)
+        for i in range(n):
+            pending, actor, func, args = queue.popleft()
+            try:
+                result = func(actor, *args)
+            except Exception as e:
+                traceback.print_exc()
+                pending.fail(e)
+                continue
+            pending.apply(result)
+        return n
+
+############################ ASYNC HELPERS ###########################
+
+_loop = None
+
+def spawn(coro):
+    """Run a coroutine on a background asyncio loop, leaving the interpreter free.
+
+    Returns a concurrent.futures.Future for its result.
+    """
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop)
@@ -7,11 +7,29 @@
 # Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
 
 import math
-from random import randint
-
-def pr(text):
-    if False:
-        print(text)
+import random
+from array import array
+from functools import wraps
+from collections import deque, OrderedDict
+from itertools import chain
+from heapq import heappush, heappop
+from time import perf_counter
+
+from profiler import Profiler
+from commands import Pending
+from snapshot import Snapshot, restore as restore_snapshot
+from collision import SpatialHash, SweepAndPrune, swept_box, boxes_overlap,\
+    segment_hits_box, segment_hits_polygon, convex_hull, hull_axes, convex_shapes_overlap,\
+    convex_shapes_sweep
+
+# Set to True to print tracepoints as the engine runs. Tracepoints are written
+# as 'if TRACE: pr(...)', so that when tracing is off nothing is formatted or
+# even called.
+TRACE = False
+
+def pr(text, *args):
+    "Print a tracepoint - text is formatted with args only when printed."
+    print(text.format(*args) if args else text)
 
 ######################### UTILITY FUNCTIONS ##########################
 
@@ -19,9 +37,53 @@ def within_range(n, low, high):
     "Returns True if n is within range (inclusive)."
     return n >= low and n <= high
 
-def rand_canvas_pos(gui):
-    return [randint(0, gui.get_width()),
-            randint(0, gui.get_height())]
+def rand_canvas_pos(game):
+    return [game.random.randint(0, game.width),
+            game.random.randint(0, game.height)]
+
+def command(method):
+    """Decorator for actor methods which user code calls to control the game.
+
+    If the game has a commands.CommandQueue, calls made from any thread other
+    than the game loop's are queued for the start of the next tick, and return
+    a commands.Pending.
+
+    If the game has a recorder, calls made from outside the game loop are
+    logged with the current tick so that the game can be replayed. Calls made
+    by other commands, or by the engine itself, are not logged.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args):
+        queue = self.game.commands
+        if queue is not None and not queue.on_game_thread():
+            return queue.put(self, wrapper, args)
+        rec = self.game.recorder
+        if rec is None or rec.depth or self.game.stepping:
+            return method(self, *args)
+        rec.log_command(self, name, args)
+        rec.depth += 1
+        try:
+            return method(self, *args)
+        finally:
+            rec.depth -= 1
+    return wrapper
+
+def game_command(method):
+    """Decorator for Game methods which user code calls, like restore().
+
+    Like command, calls from any thread other than the game loop's are queued
+    for the start of the next tick when the game has a commands.CommandQueue.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args):
+        queue = self.commands
+        if queue is not None and not queue.on_game_thread():
+            return queue.put(self, wrapper, args)
+        return method(self, *args)
+    return wrapper
 
 def rotate_vertex(x, y, center_x, center_y, degrees):
     # get horizontal & vertical lengths
@@ -40,55 +102,183 @@ def rotate_vertex(x, y, center_x, center_y, degrees):
     y_out = center_y + (h_len * (math.sin(angle)))
     return [x_out, y_out]
 
+# sin and cos of every whole degree, for the movement path
+SIN_COS_TABLE = [(math.sin(math.radians(deg)), math.cos(math.radians(deg)))
+                 for deg in range(360)]
+
+def sin_cos(degrees):
+    "Returns (sin, cos) of an angle in degrees, looked up for whole degrees."
+    i = int(degrees)
+    if i == degrees:
+        return SIN_COS_TABLE[i % 360]
+    rad = math.radians(degrees)
+    return (math.sin(rad), math.cos(rad))
+
+class RotatedShape(object):
+    """A shape archetype rotated about the origin - everything but the position.
+
+    offsets: flat tuple of rotated vertex offsets
+    box:     bounding box of the offsets
+    hull:    convex hull of the offsets
+    axes:    separating axes of the hull, for the collision narrow phase
+    """
+
+    __slots__ = ('offsets', 'box', 'hull', 'axes')
+
+    def __init__(self, archetype, degrees):
+        offsets = []
+        for i in range(0, len(archetype), 2):
+            offsets.extend(rotate_vertex(archetype[i], archetype[i + 1], 0, 0, degrees))
+        xs = offsets[0::2]
+        ys = offsets[1::2]
+        self.offsets = tuple(offsets)
+        self.box = (min(xs), min(ys), max(xs), max(ys))
+        self.hull = tuple(convex_hull(offsets))
+        self.axes = tuple(hull_axes(self.hull))
+
+class RotationCache(object):
+    """Rotated shape archetypes, so rebuilding a shape only needs a translation.
+
+    Whole-degree rotations are kept in a 360 entry table per archetype, filled
+    in as they are needed. Other angles go in a bounded LRU cache.
+    """
+
+    def __init__(self, lru_size=1024):
+        self.tables = {}
+        self.lru = OrderedDict()
+        self.lru_size = lru_size
+
+    def get(self, archetype, degrees):
+        "Returns the RotatedShape for archetype (a tuple) rotated by degrees."
+        i = int(degrees)
+        if i == degrees:
+            table = self.tables.get(archetype)
+            if table is None:
+                table = self.tables[archetype] = [None] * 360
+            i %= 360
+            entry = table[i]
+            if entry is None:
+                entry = table[i] = RotatedShape(archetype, i)
+            return entry
+        key = (archetype, degrees)
+        entry = self.lru.get(key)
+        if entry is None:
+            entry = self.lru[key] = RotatedShape(archetype, degrees)
+            if len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+        else:
+            self.lru.move_to_end(key)
+        return entry
+
+rotation_cache = RotationCache()
+
+class RollingStats(object):
+    """Keeps the most recent samples and reports min, mean and 99th percentile."""
+
+    def __init__(self, size=100):
+        self.samples = deque(maxlen=size)
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def summary(self):
+        "Returns (min, mean, p99), or (0, 0, 0) if there are no samples yet."
+        if not self.samples:
+            return (0.0, 0.0, 0.0)
+        ordered = sorted(self.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return (ordered[0], sum(ordered) / len(ordered), p99)
+
 ########################### EDGE BEHAVIOUR ###########################
 
-def do_nothing_on_edges(gui, actor):
+# An actor's edge_behaviour is called once per tick for all the actors which
+# share it and moved that tick, as edge_behaviour(game, actors). The arena
+# size comes from game.width and game.height, so no GUI calls are needed.
+
+def do_nothing_on_edges(game, actors):
     pass
 
-def die_on_edges(gui, actor):
+def die_on_edges(game, actors):
     """Die if actor.position is outside of bounds."""
-    pr('die_on_edges')
-    p = actor.position
-    if p[0] < 0 or p[1] < 0 or p[0] > gui.get_width() or p[1] > gui.get_height():
-        actor.is_live = False
-
-def bounce_on_edges(gui, actor):
+    if TRACE: pr('die_on_edges: {} actors', len(actors))
+    w = game.width
+    h = game.height
+    for actor in actors:
+        x, y = actor._position
+        if x < 0 or y < 0 or x > w or y > h:
+            actor.is_live = False
+
+def bounce_on_edges(game, actors):
     """Bounce if any part of actor's bounding box is outside of bounds."""
-    pr('bounce_on_edges')
-    a = actor
-    box = actor.bbox
-    if not box:
-        print("WARNING! engine.bounce_on_edges() - Actor {} has no bounding box".format(a.name))
-    if box[0] < 0 and within_range(a.angle, 181, 359):
-        diff = 270 - a.angle
-        a.angle = 90 + diff
-    elif box[1] < 0 and within_range(a.angle, 91, 269):
-        diff = 180 - a.angle
-        a.angle = 0 + diff
-    elif box[2] > gui.get_width() and within_range(a.angle, 1, 179):
-        diff = 90 - a.angle
-        a.angle = 270 + diff
-    elif box[3] > gui.get_height()\
-         and (within_range(a.angle, 0, 89) or within_range(a.angle, 271, 359)):
-        diff = 0 - a.angle
-        a.angle = 180 + diff
-    a.angle = a.angle % 360
+    if TRACE: pr('bounce_on_edges: {} actors', len(actors))
+    w = game.width
+    h = game.height
+    for a in actors:
+        box = a.bbox
+        if not box:
+            print("WARNING! engine.bounce_on_edges() - Actor {} has no bounding box".format(a.name))
+            continue
+        # most of the time nothing is near an edge
+        if box[0] >= 0 and box[1] >= 0 and box[2] <= w and box[3] <= h\
+           and 0 <= a.angle < 360:
+            continue
+        if box[0] < 0 and within_range(a.angle, 181, 359):
+            diff = 270 - a.angle
+            a.angle = 90 + diff
+        elif box[1] < 0 and within_range(a.angle, 91, 269):
+            diff = 180 - a.angle
+            a.angle = 0 + diff
+        elif box[2] > w and within_range(a.angle, 1, 179):
+            diff = 90 - a.angle
+            a.angle = 270 + diff
+        elif box[3] > h\
+             and (within_range(a.angle, 0, 89) or within_range(a.angle, 271, 359)):
+            diff = 0 - a.angle
+            a.angle = 180 + diff
+        a.angle = a.angle % 360
 
 ############################ JOB OBJECTS #############################
 
 class Job(object):
+    """Calls job_func once, after the given number of steps.
+
+    A job whose job_func sets steps again (like DroneController) is not
+    expired, and is rescheduled to run again after that many steps.
+    """
 
     # steps = 1
     job_func = None
+    done_callbacks = ()
+    # actor which scheduled the job - woken when it fires
+    owner = None
 
     def __init__(self, job_func, steps=0):
         self.steps = steps + 1
         self.job_func = job_func
 
+    def add_done_callback(self, fn):
+        "Call fn() once the job has fired for the last time."
+        if not self.done_callbacks:
+            self.done_callbacks = []
+        self.done_callbacks.append(fn)
+
     def is_expired(self):
         return self.steps < 1
 
+    def ticks_until_due(self):
+        "Number of ticks (counting the next one as 1) until the job fires."
+        return max(1, int(self.steps))
+
+    def fire(self):
+        "Called by the game's JobScheduler when the job is due."
+        self.steps = 0
+        self.job_func()
+        if self.done_callbacks and self.is_expired():
+            for fn in self.done_callbacks:
+                fn()
+
     def run(self):
+        "Count down one step by hand, firing when no steps are left."
         self.steps -= 1
         if self.steps < 1:
             self.job_func()
@@ -100,91 +290,649 @@ class DroneController(Job):
     def __init__(self, ship):
         super().__init__(job_func=self.next_action)
         self.ship = ship
-        self.steps = randint(500, 3000)
+        self.steps = ship.game.random.randint(500, 3000)
 
     def next_action(self):
-        self.steps = randint(500, 3000)
-        angle = randint(0, 359)
-        dist = randint(100, 1000)
+        # stop when the ship is gone
+        if not self.ship.is_live:
+            return
+        rng = self.ship.game.random
+        self.steps = rng.randint(500, 3000)
+        angle = rng.randint(0, 359)
+        dist = rng.randint(100, 1000)
         self.ship.move(angle, dist)
 
+class JobScheduler(object):
+    """Game-wide job queue: a min-heap of jobs keyed on the tick they fall due.
+
+    Each tick only the jobs which are due are touched, however many jobs are
+    waiting.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.count = 0
+        # first tick whose jobs have not been run yet
+        self.next_tick = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, job):
+        due = self.next_tick + job.ticks_until_due() - 1
+        # count breaks ties, so jobs due on the same tick run in order added
+        heappush(self.heap, (due, self.count, job))
+        self.count += 1
+
+    def run_due(self, tick):
+        """Fire every job due on or before tick. Returns number of jobs fired.
+
+        A sleeping actor is woken before any job it scheduled fires.
+        """
+        heap = self.heap
+        # jobs added from here on wait until the next tick
+        self.next_tick = tick + 1
+        fired = 0
+        while heap and heap[0][0] <= tick:
+            job = heappop(heap)[2]
+            owner = job.owner
+            if owner is not None and owner.asleep:
+                owner.game.wake(owner)
+            job.fire()
+            fired += 1
+            if not job.is_expired():
+                self.add(job)
+        return fired
+
+########################### ACTOR REGISTRY ###########################
+
+class ActorRegistry(object):
+    """All of a game's actors, indexed by id and by kind.
+
+    Each actor gets a stable id the first time it is added. Adding, checking
+    membership and removing are all O(1), and iteration is in order of
+    addition.
+
+    Actors are also split into awake and sleeping - see Game.sleep().
+    """
+
+    def __init__(self):
+        self.next_id = 1
+        self.by_id = {}
+        self.by_kind = {}
+        self.awake = {}
+        self.sleeping = {}
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __contains__(self, actor):
+        return actor.id is not None and self.by_id.get(actor.id) is actor
+
+    def add(self, actor):
+        "Returns False if actor was already registered."
+        if actor in self:
+            return False
+        if actor.id is None:
+            actor.id = self.next_id
+            self.next_id += 1
+        self.by_id[actor.id] = actor
+        self.by_kind.setdefault(actor.kind, {})[actor.id] = actor
+        actor.asleep = False
+        self.awake[actor.id] = actor
+        return True
+
+    def remove(self, actor):
+        del self.by_id[actor.id]
+        del self.by_kind[actor.kind][actor.id]
+        self.awake.pop(actor.id, None)
+        self.sleeping.pop(actor.id, None)
+        actor.asleep = False
+
+    def sleep(self, actor):
+        del self.awake[actor.id]
+        self.sleeping[actor.id] = actor
+        actor.asleep = True
+
+    def wake(self, actor):
+        del self.sleeping[actor.id]
+        self.awake[actor.id] = actor
+        actor.asleep = False
+
+    def restore(self, actors, awake_ids, sleeping_ids, next_id):
+        """Replace the contents with actors, in order, which are split between
+        awake and sleeping by the ids given, in their order."""
+        self.next_id = next_id
+        self.by_id = by_id = {}
+        self.by_kind = {}
+        for a in actors:
+            by_id[a.id] = a
+            self.by_kind.setdefault(a.kind, {})[a.id] = a
+        self.awake = {i: by_id[i] for i in awake_ids}
+        self.sleeping = {i: by_id[i] for i in sleeping_ids}
+        for a in self.sleeping.values():
+            a.asleep = True
+
+    def get(self, actor_id):
+        return self.by_id.get(actor_id)
+
+    def of_kind(self, *kinds):
+        "Iterate over the actors of the given kinds, e.g. of_kind('ship', 'bullet')"
+        for kind in kinds:
+            bucket = self.by_kind.get(kind)
+            if bucket:
+                yield from bucket.values()
+
 ############################ GAME ENGINE #############################
 
 class Game(object):
     """The game engine."""
 
     num_drones = 3
-    actors = []
-    actors_to_add = []
+    tick = 0
+    stepping = False
     player = None
     gui = None
+    # replay.Recorder logging commands, or None
+    recorder = None
+    # profiler.Profiler collecting timings, or None
+    profiler = None
+    # commands.CommandQueue for commands sent from other threads, or None
+    commands = None
+    # collision broadphase: 'sap' (sort and sweep, catches fast movers part
+    # way through a tick), 'grid' (spatial hash) or 'brute' (test every pair)
+    broadphase = 'sap'
+    grid_cell_size = 64
+    # kinds of actor which have bounding boxes to collide with
+    collision_kinds = ('ship', 'bullet', 'polygon')
+    # after bounding boxes overlap, test the actual shapes as well
+    narrow_phase = True
+    # batch.BatchPhysics store, or None to move each actor individually
+    physics = None
+    # size of the arena, kept up to date by the GUI through resize()
+    width = 800
+    height = 800
+    # ticks between automatic snapshots (0 for none), and how many to keep
+    snapshot_every = 20
+    max_snapshots = 30
 
     # debugging
     show_bounding_boxes = False
-
-    def __init__(self):
+    show_timings = True
+    max_pool_size = 1000
+    phases = ('action', 'collisions', 'garbage', 'display')
+
+    def __init__(self, seed=None):
+        # all randomness comes from here, so a seed fixes the whole game
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.actors = ActorRegistry()
+        self.actors_to_add = []
+        # actors which moved under their own velocity this tick
+        self.moved = []
+        # actors which stood still this tick - put to sleep once collisions
+        # have seen them where they are
+        self.still = []
+        self.jobs = JobScheduler()
+        self.spatial_hash = SpatialHash(self.grid_cell_size)
+        # sleeping actors which can be collided with, kept between ticks
+        self.static_hash = SpatialHash(self.grid_cell_size)
+        self.num_static = 0
+        self.sweep_and_prune = SweepAndPrune()
+        # whether bounding boxes were shown last display
+        self.boxes_drawn = False
+        # draw every actor next display, even those asleep
+        self.full_redraw = False
+        # recent snapshot.Snapshots, oldest first
+        self.snapshots = deque(maxlen=self.max_snapshots)
+        self.timings = {phase: RollingStats() for phase in self.phases}
+        # dead projectiles waiting to be recycled, by class
+        self.pool = {}
+        self.pool_hits = 0
+        self.pool_misses = 0
+        # collision pairs with overlapping boxes, and those which really touched
+        self.collision_candidates = 0
+        self.collision_hits = 0
+        # actors whose shape had to be rebuilt this tick
+        self.shape_updates = 0
         self.player = Ship(self, 'magenta')
         self.player.quiet_mode = False
         self.player.name = 'player'
-        self.player.position = [200, 200]
+        self.player.place(200, 200)
         self.add_actor(self.player)
 
     def setup(self, gui):
         self.gui = gui
+        self.resize(gui.get_width(), gui.get_height())
+
+    def resize(self, width, height):
+        """Set the size of the arena - GUIs call this whenever their canvas changes size."""
+        self.width = width
+        self.height = height
 
     def add_actor(self, actor):
         self.actors_to_add.append(actor)
 
+    def schedule(self, job):
+        "Schedule a job to be done after job.steps ticks."
+        self.jobs.add(job)
+
+    def make_projectile(self, cls, *args):
+        """Returns a new projectile of class cls, recycling a dead one if possible.
+
+        args are passed to cls.reset() for a recycled projectile, or to the
+        constructor after game for a new one.
+        """
+        free = self.pool.get(cls)
+        if free:
+            self.pool_hits += 1
+            actor = free.pop()
+            actor.reset(*args)
+        else:
+            self.pool_misses += 1
+            actor = cls(self, *args)
+        return actor
+
+    def sleep(self, actor):
+        """Park an actor which is standing still.
+
+        Sleeping actors don't act, and are only tested for collisions against
+        actors which are awake. They wake when hit, when a job they scheduled
+        fires, or when they are moved, rotated or given a velocity.
+        """
+        self.actors.sleep(actor)
+        if actor.kind in self.collision_kinds:
+            self.static_hash.insert(actor)
+            self.num_static += 1
+
+    def settle(self):
+        "Put to sleep the actors which stood still this tick, now they have been collision tested."
+        for a in self.still:
+            if a.is_live and not a.asleep and not a._velocity and a.id in self.actors.awake:
+                self.sleep(a)
+        self.still.clear()
+
+    def wake(self, actor):
+        if actor.kind in self.collision_kinds:
+            self.static_hash.remove(actor)
+            self.num_static -= 1
+        self.actors.wake(actor)
+
+    def use_batch_physics(self, enabled=True):
+        """Switch the NumPy batched physics mode on or off (requires numpy)."""
+        if enabled and not self.physics:
+            from batch import BatchPhysics
+            # batched actors move together, so never sleep
+            for a in list(self.actors.sleeping.values()):
+                self.wake(a)
+            self.physics = BatchPhysics()
+            for a in self.actors:
+                self._attach_physics(a)
+        elif not enabled and self.physics:
+            self.physics.detach_all()
+            self.physics = None
+
+    def _attach_physics(self, actor):
+        if self.physics and isinstance(actor, PolygonActor):
+            self.physics.attach(actor)
+
     def iterate_loop(self, gui):
         "The main game loop"
+        self.step(gui)
+        self.render(gui)
+
+    def step(self, gui):
+        "Advance the simulation by one tick."
+        if self.commands:
+            self.commands.drain()
+        if self.recorder:
+            self.recorder.before_step(self, gui)
+        prof = self.profiler
+        if prof:
+            prof.before_step()
+        self.stepping = True
+        self.shape_updates = 0
+        t0 = perf_counter()
         self.action(gui)
+        t1 = perf_counter()
         self.collisions()
+        self.settle()
+        t2 = perf_counter()
         self.garbage_collection(gui)
+        t3 = perf_counter()
+        self.timings['action'].add(t1 - t0)
+        self.timings['collisions'].add(t2 - t1)
+        self.timings['garbage'].add(t3 - t2)
+        if prof:
+            prof.record('action', t1 - t0)
+            prof.record('collisions', t2 - t1)
+            prof.record('garbage', t3 - t2)
+            prof.after_step()
+        self.stepping = False
+        self.tick += 1
+        if self.snapshot_every and self.tick % self.snapshot_every == 0:
+            self.snapshots.append(Snapshot(self))
+
+    def render(self, gui):
+        "Draw the current state of the game."
+        t0 = perf_counter()
         self.display(gui)
+        dt = perf_counter() - t0
+        self.timings['display'].add(dt)
+        if self.profiler:
+            self.profiler.record('display', dt)
+
+    def profile(self, cprofile=0, per_actor=True):
+        """Start collecting timing histograms, shown live in the info text.
+
+        cprofile: also run cProfile over this many ticks, then print the stats
+        per_actor: also time each kind of actor separately
+
+        See profiler.py.
+        """
+        if self.profiler is None:
+            self.profiler = Profiler(per_actor)
+        self.profiler.per_actor = per_actor
+        if cprofile:
+            self.profiler.capture(cprofile)
+        return self.profiler
+
+    def stop_profiling(self):
+        self.profiler = None
+
+    #### SNAPSHOTS ####
+
+    @game_command
+    def snapshot(self):
+        "Take a snapshot now, returning it - it goes in game.snapshots too."
+        snap = Snapshot(self)
+        self.snapshots.append(snap)
+        return snap
+
+    @game_command
+    def restore(self, snap=None):
+        """Go back to a snapshot, by default the latest. Returns its tick.
+
+        Snapshots taken after it are forgotten. snap may be the Pending which
+        snapshot() returns when called from another thread.
+        """
+        if isinstance(snap, Pending):
+            # queued in order, so the snapshot has been taken by now
+            if not snap.done():
+                print("WARNING! Game.restore() - snapshot hasn't been taken yet")
+                return None
+            snap = snap.wait()
+        if self.recorder:
+            print("WARNING! Game.restore() - can't go back while recording")
+            return None
+        if snap is None:
+            if not self.snapshots:
+                print('WARNING! Game.restore() - no snapshots yet')
+                return None
+            snap = self.snapshots[-1]
+        restore_snapshot(self, snap)
+        while self.snapshots and self.snapshots[-1].tick > snap.tick:
+            self.snapshots.pop()
+        return snap.tick
+
+    @game_command
+    def rewind(self, ticks=100):
+        """Go back to the latest snapshot at least this many ticks ago - or the
+        oldest there is. Returns the tick gone back to."""
+        target = self.tick - ticks
+        for snap in reversed(self.snapshots):
+            if snap.tick <= target:
+                break
+        else:
+            if not self.snapshots:
+                print('WARNING! Game.rewind() - no snapshots yet')
+                return None
+            snap = self.snapshots[0]
+        return self.restore(snap)
+
+    def timings_text(self):
+        "Returns a table of rolling phase timings in milliseconds."
+        lines = ['{:<11}{:>7}{:>7}{:>7}'.format('phase (ms)', 'min', 'mean', 'p99')]
+        for phase in self.phases:
+            lo, mean, p99 = self.timings[phase].summary()
+            lines.append('{:<11}{:>7.2f}{:>7.2f}{:>7.2f}'.format(
+                phase, lo * 1000, mean * 1000, p99 * 1000))
+        return '\n'.join(lines)
 
     def action(self, gui):
         # any actors to add
         while self.actors_to_add:
             # check for duplicate
             a = self.actors_to_add.pop()
-            if not (a in self.actors):
-                pr("adding actor")
-                self.actors.append(a)
+            if self.actors.add(a):
+                if TRACE: pr("adding actor")
+                self._attach_physics(a)
+                a.create_gui(gui)
         # add more drones if required
         while len(self.actors) - 1 < self.num_drones:
-            pr("adding drone")
+            if TRACE: pr("adding drone")
             drone = Ship(self, 'grey')
             drone.name = 'drone'
-            drone.position = rand_canvas_pos(gui)
+            drone.place(*rand_canvas_pos(self))
             drone.schedule(DroneController(drone))
-            self.actors.append(drone)
-        # each actor perform it's action
-        for a in self.actors:
-            a.act(gui)
+            self.actors.add(drone)
+            self._attach_physics(drone)
+            drone.create_gui(gui)
+        # do any jobs which are due
+        self.jobs.run_due(self.tick)
+        # each awake actor perform it's action (an actor may go to sleep)
+        awake = list(self.actors.awake.values())
+        prof = self.profiler
+        if prof and prof.per_actor:
+            for a in awake:
+                t = perf_counter()
+                a.act(gui)
+                prof.record('act', perf_counter() - t, a.kind)
+        else:
+            for a in awake:
+                a.act(gui)
+        # batched actors move all at once
+        if self.physics:
+            self.physics.step()
+            self.moved.extend(self.physics.actors)
+        self.edges()
+
+    def edges(self):
+        "Deal with screen edges for the actors which moved this tick, a group at a time."
+        groups = {}
+        for a in self.moved:
+            behaviour = a.edge_behaviour
+            if behaviour is not do_nothing_on_edges:
+                group = groups.get(behaviour)
+                if group is None:
+                    groups[behaviour] = [a]
+                else:
+                    group.append(a)
+        self.moved.clear()
+        for behaviour, actors in groups.items():
+            behaviour(self, actors)
 
     def collisions(self):
-        for a in self.actors:
-            for b in self.actors:
-                if a != b:
+        self.collision_candidates = 0
+        self.collision_hits = 0
+        if self.broadphase == 'sap':
+            self.sap_collisions()
+        elif self.broadphase == 'grid':
+            self.grid_collisions()
+        else:
+            self.brute_force_collisions()
+        self.laser_collisions()
+
+    def moving_collidables(self):
+        "Awake actors which can be collided with."
+        kinds = self.collision_kinds
+        return [a for a in self.actors.awake.values() if a.kind in kinds]
+
+    def brute_force_collisions(self):
+        "Test each unordered pair of awake actors once, and each awake actor against each sleeping one."
+        actors = self.moving_collidables()
+        n = len(actors)
+        for i in range(n - 1):
+            a = actors[i]
+            for j in range(i + 1, n):
+                self.collision_detection(a, actors[j])
+        kinds = self.collision_kinds
+        static = [b for b in self.actors.sleeping.values() if b.kind in kinds]
+        if static:
+            for a in actors:
+                for b in static:
                     self.collision_detection(a, b)
 
+    def grid_collisions(self):
+        """Only test pairs of actors which share a cell of the spatial hash.
+
+        Awake actors are filed afresh each tick; sleeping ones stay filed in
+        the static hash, and are only tested against awake ones.
+        """
+        moving = self.moving_collidables()
+        self.spatial_hash.cell_size = self.grid_cell_size
+        self.spatial_hash.rebuild(moving)
+        for a, b in self.spatial_hash.candidate_pairs():
+            self.collision_detection(a, b)
+        grid = self.spatial_hash
+
+        def lookup(sleepers):
+            return ((a, b) for b, a in grid.pairs_with(sleepers))
+
+        for a, b in self.static_pairs(moving, lookup):
+            self.collision_detection(a, b)
+
+    def sap_collisions(self):
+        """Sort and sweep over swept boxes.
+
+        Each awake actor's box is stretched back over the ground it covered
+        this tick, so a bullet can't jump clean through something between one
+        tick and the next. Sleeping actors are looked up in the static hash.
+        """
+        tick = self.tick
+        sap = self.sweep_and_prune
+        boxes = {}
+        for a in self.moving_collidables():
+            box = a.bbox
+            if not box:
+                continue
+            if a.moved_tick == tick:
+                boxes[a] = swept_box(box, a.moved_x, a.moved_y, sap.buffer(a))
+            else:
+                boxes[a] = box
+        sap.update(boxes)
+        for a, b in sap.candidate_pairs():
+            self.swept_detection(a, b)
+
+        def lookup(sleepers):
+            return ((a, b) for b in sleepers for a in sap.query_box(b.bbox))
+
+        for a, b in self.static_pairs(boxes, lookup, boxes):
+            self.swept_detection(a, b)
+
+    def static_pairs(self, moving, lookup, boxes=None):
+        """Returns a list of (awake, sleeping) pairs of actors whose boxes
+        overlap, for the broadphases which keep sleepers in the static hash.
+
+        moving:   the awake actors which can be collided with
+        lookup:   lookup(sleepers) yields (awake, sleeper) pairs from the
+                  broadphase's own structure of awake actors
+        boxes:    optional dict of awake actor -> box to use instead of bbox
+        """
+        if not self.num_static:
+            return []
+        kinds = self.collision_kinds
+        static = self.static_hash
+        if static.cell_size != self.grid_cell_size:
+            static.cell_size = self.grid_cell_size
+            static.rebuild(b for b in self.actors.sleeping.values() if b.kind in kinds)
+        # look up whichever side has fewer actors in the other's structure
+        # (gathering the pairs first, as a hit wakes the sleeper)
+        if self.num_static < len(moving):
+            sleepers = [b for b in self.actors.sleeping.values() if b.kind in kinds and b.bbox]
+            return list(lookup(sleepers))
+        return list(static.pairs_with(moving, boxes))
+
+    def laser_collisions(self):
+        "Test each laser beam against the actors its line might cross."
+        if self.broadphase == 'sap' and self.actors.by_kind.get('laser'):
+            # a beam is best traced through a grid - only build one if there are any
+            self.spatial_hash.cell_size = self.grid_cell_size
+            self.spatial_hash.rebuild(self.moving_collidables())
+        for beam in self.actors.of_kind('laser'):
+            ln = beam.line
+            if self.broadphase in ('sap', 'grid'):
+                # walk only the grid cells which the beam crosses (gathering the
+                # targets first, as a hit wakes a sleeper)
+                targets = list(chain(self.spatial_hash.query_segment(ln[0], ln[1], ln[2], ln[3]),
+                                     self.static_hash.query_segment(ln[0], ln[1], ln[2], ln[3])))
+            else:
+                targets = self.actors.of_kind(*self.collision_kinds)
+            for target in targets:
+                self.beam_detection(beam, target)
+
     def garbage_collection(self, gui):
         to_remove = []
         for a in self.actors:
             if not a.is_live:
                 to_remove.append(a)
         for a in to_remove:
+            if a.asleep:
+                self.wake(a)
             self.actors.remove(a)
-            a.dispose_gui(gui)
+            if self.physics:
+                self.physics.detach(a)
+            # (a projectile with a death timer still pending can't be reused)
+            free = self.pool.setdefault(type(a), []) if a.poolable and not a.dying else None
+            if free is not None and len(free) < self.max_pool_size:
+                a.hide_gui(gui)
+                free.append(a)
+            else:
+                a.dispose_gui(gui)
 
     def display(self, gui):
-        for a in self.actors:
-            a.update_gui_shape(gui)
+        prof = self.profiler
+        # GUIs without a raster renderer needn't have the attribute at all
+        renderer = getattr(gui, 'renderer', None)
+        if renderer:
+            # the whole frame is drawn as one image
+            renderer.render(self)
+        else:
+            # sleeping actors are drawn already - unless bounding boxes are
+            # shown or have just been switched off
+            boxes = self.show_bounding_boxes
+            if boxes or self.boxes_drawn or self.full_redraw:
+                actors = self.actors
+            else:
+                actors = list(self.actors.awake.values())
+            self.boxes_drawn = boxes
+            self.full_redraw = False
+            if prof and prof.per_actor:
+                for a in actors:
+                    t = perf_counter()
+                    a.update_gui_shape(gui)
+                    prof.record('draw', perf_counter() - t, a.kind)
+            else:
+                for a in actors:
+                    a.update_gui_shape(gui)
 
         extra_text = '' if self.player.is_live else '\n\nSHIP DESTROYED!'
-        gui.set_info_text('show boxes: {}\nscore: {}{}'.format(self.show_bounding_boxes,
-                                                               self.player.score,
-                                                               extra_text))
+        if self.show_timings:
+            extra_text += '\n\n' + self.timings_text()
+        if prof:
+            extra_text += '\n\n' + prof.overlay_text()
+        gui.set_info_text('show boxes: {}\npool hits/misses: {}/{}\n'
+                          'collision candidates/hits: {}/{}\nshapes rebuilt: {}\n'
+                          'actors awake/sleeping: {}/{}\nscore: {}{}'.format(
+            self.show_bounding_boxes, self.pool_hits, self.pool_misses,
+            self.collision_candidates, self.collision_hits, self.shape_updates,
+            len(self.actors.awake), len(self.actors.sleeping),
+            self.player.score, extra_text))
 
     def collision_detection(self, a, b):
         """Do collision detection for two Actors."""
@@ -199,60 +947,173 @@ class Game(object):
                     # y bounds
                     if ba[1] <= bb[3]:
                         if bb[1] <= ba[3]:
-                            # kill both actors
-                            a.collision(hit_by=b)
-                            b.collision(hit_by=a)
+                            self.collision_candidates += 1
+                            if self.narrow_phase and not self.shapes_overlap(a, b):
+                                return
+                            self.hit(a, b)
+
+    def hit(self, a, b):
+        self.collision_hits += 1
+        # kill both actors
+        a.collision(hit_by=b)
+        b.collision(hit_by=a)
+
+    def swept_detection(self, a, b):
+        """Collision detection for two actors which may have touched at any
+        point of the tick's moves, not just where they ended up.
+
+        With narrow_phase on, the shapes themselves are swept, so an actor
+        which only crosses an empty corner of another's box is not hit.
+        """
+        ba = a.bbox
+        bb = b.bbox
+        tick = self.tick
+        ax, ay = (a.moved_x, a.moved_y) if a.moved_tick == tick else (0.0, 0.0)
+        bx, by = (b.moved_x, b.moved_y) if b.moved_tick == tick else (0.0, 0.0)
+        # a's motion as seen from b
+        dx = ax - bx
+        dy = ay - by
+        if not dx and not dy:
+            self.collision_detection(a, b)
+            return
+        if not boxes_overlap(ba, bb):
+            # does the centre of a, starting where it started, cross b's
+            # starting box grown by half of a's size?
+            half_w = (ba[2] - ba[0]) / 2
+            half_h = (ba[3] - ba[1]) / 2
+            x0 = (ba[0] + ba[2]) / 2 - ax
+            y0 = (ba[1] + ba[3]) / 2 - ay
+            grown = (bb[0] - bx - half_w, bb[1] - by - half_h,
+                     bb[2] - bx + half_w, bb[3] - by + half_h)
+            if not segment_hits_box(x0, y0, x0 + dx, y0 + dy, grown):
+                return
+        self.collision_candidates += 1
+        if self.narrow_phase and not self.shapes_meet(a, b, ax, ay, bx, by):
+            return
+        self.hit(a, b)
+
+    def shapes_overlap(self, a, b):
+        """Separating axis test on the actual shapes of two PolygonActors."""
+        ra = a.rotated
+        rb = b.rotated
+        pa = a._position
+        pb = b._position
+        return convex_shapes_overlap(ra.hull, ra.axes, pa[0], pa[1],
+                                     rb.hull, rb.axes, pb[0], pb[1])
+
+    def shapes_meet(self, a, b, ax, ay, bx, by):
+        """Swept separating axis test: did the shapes of two PolygonActors touch
+        anywhere along this tick's moves of (ax, ay) and (bx, by)?"""
+        ra = a.rotated
+        rb = b.rotated
+        pa = a._position
+        pb = b._position
+        return convex_shapes_sweep(ra.hull, ra.axes, pa[0] - ax, pa[1] - ay,
+                                   rb.hull, rb.axes, pb[0] - bx, pb[1] - by,
+                                   ax - bx, ay - by) is not None
+
+    def beam_detection(self, beam, target):
+        """Do collision detection for a LaserBeam and an Actor.
+
+        A beam never hits its own ship, and hits each target only once.
+        """
+        if target is beam.parent or target.id in beam.hit_ids:
+            return
+        box = target.bbox
+        ln = beam.line
+        if box and segment_hits_box(ln[0], ln[1], ln[2], ln[3], box)\
+           and segment_hits_polygon(ln[0], ln[1], ln[2], ln[3], target.shape):
+            beam.hit_ids.add(target.id)
+            target.collision(hit_by=beam)
 
 class Actor(object):
-    """Abstract base class for actors."""
-
-    game = None
-    quiet_mode = True
-    name = 'unnamed'
-    is_live = True
-    scheduled_jobs = []
-    new_jobs = []
-    edge_behaviour = do_nothing_on_edges
-    score = 0
-    # geometry
-    position = [0, 0]
-    bbox = [] # bounding box
-    # gui objects
-    gui_shape = None
-    gui_bbox = None
+    """Abstract base class for actors.
+
+    Actors have __slots__ rather than a __dict__, and keep their geometry in
+    array('d') buffers which are updated in place as they move - see
+    PolygonActor._update_shape. Subclasses must declare __slots__ for any new
+    attributes, and give them their starting values in __init__.
+    """
+
+    __slots__ = ('game', 'id', 'quiet_mode', 'name', 'is_live', 'dying', 'asleep',
+                 'edge_behaviour', 'score', '_position',
+                 'gui_shape', 'gui_bbox', 'gui_color')
+
+    kind = 'actor'
+    # dead actors of a poolable class are recycled by Game.make_projectile
+    poolable = False
+    # attributes kept by a snapshot (see snapshot.py) besides position -
+    # those in copied_attrs are mutable, so are saved and restored as copies.
+    # Settings which only player code changes, like name and edge_behaviour,
+    # are left out: each one costs every actor in every snapshot.
+    saved_attrs = ('is_live', 'dying', 'score')
+    copied_attrs = ()
+    # bounding box - actors without a shape have none
+    bbox = ()
 
     def __init__(self, game):
         self.game = game
+        self.id = None
+        self.quiet_mode = True
+        self.name = 'unnamed'
+        self.is_live = True
+        self.dying = False
+        self.asleep = False
+        self.edge_behaviour = do_nothing_on_edges
+        self.score = 0
+        # geometry
+        self._position = array('d', (0.0, 0.0))
+        # gui objects - created when added to the game, deleted when removed
+        self.gui_shape = None
+        self.gui_bbox = None
+        self.gui_color = None
+
+    def _get_position(self):
+        # whoever asks may write to it in place, so count that as a move
+        self._will_move()
+        return self._position
+
+    def _set_position(self, value):
+        self._will_move()
+        p = self._position
+        p[0] = value[0]
+        p[1] = value[1]
+
+    position = property(_get_position, _set_position)
+
+    def _will_move(self):
+        "Call before changing position."
+        pass
+
+    def place(self, x, y):
+        "Set position, in place."
+        p = self._position
+        p[0] = x
+        p[1] = y
 
     def msg(self, text):
         if not self.quiet_mode:
             print(text)
 
+    def restored(self):
+        "Called when a snapshot has put back the saved attributes and position."
+        pass
+
     def act(self, gui):
-        pr('Actor.act()')
-        # add new jobs
-        while self.new_jobs:
-            self.scheduled_jobs.append(self.new_jobs.pop())
-        # do scheduled jobs
-        rem = []
-        for job in self.scheduled_jobs:
-            if job.is_expired():
-                rem.append(job)
-            else:
-                job.run()
-        # garbage collection
-        for job in rem:
-            pr("removing completed job from schedule")
-            self.scheduled_jobs.remove(job)
+        if TRACE: pr('Actor.act()')
 
     def schedule(self, job):
         "Schedule a new job to be done after specified number of steps"
-        self.new_jobs.append(job)
+        if job.owner is None:
+            job.owner = self
+        self.game.schedule(job)
 
     def die(self):
         self.is_live = False
 
     def collision(self, hit_by=None):
+        if self.asleep:
+            self.game.wake(self)
         self.die()
         if hit_by:
             hit_by.incr_score(1)
@@ -260,99 +1121,244 @@ class Actor(object):
     def incr_score(self, amt):
         self.score += amt
 
+    def create_gui(self, gui):
+        "Create this actor's canvas items. Called once, when added to the game."
+        pass
+
+    def update_gui_shape(self, gui):
+        "Bring existing canvas items up to date."
+        pass
+
+    def rasterise(self, renderer):
+        "Draw into a renderer.RasterRenderer, instead of using canvas items."
+        pass
+
+    def hide_gui(self, gui):
+        "Hide canvas items so that a recycled actor can show them again."
+        if self.gui_shape:
+            gui.get_canvas().itemconfig(self.gui_shape, state='hidden')
+        if self.gui_bbox:
+            gui.get_canvas().delete(self.gui_bbox)
+            self.gui_bbox = None
+
     def dispose_gui(self, gui):
         if self.gui_shape:
             gui.get_canvas().delete(self.gui_shape)
+            self.gui_shape = None
         if self.gui_bbox:
             gui.get_canvas().delete(self.gui_bbox)
+            self.gui_bbox = None
 
 class PolygonActor(Actor):
-    """An actor with polygonal shape."""
+    """An actor with polygonal shape.
+
+    shape, bbox and rotated are worked out from position and rotation only
+    when they are next read after a change, which sets shape_dirty - so an
+    actor which is standing still costs nothing to keep up to date. Likewise
+    its canvas item is only moved while gui_dirty is set.
+
+    Reading position or writing rotation counts as a move, so that writes
+    like p.position[0] = 600 are noticed - engine code reads _position.
+    """
 
-    rotation = 0
-    angle = 0
-    velocity = 0
-    shape_archetype = None
-    color_archetype = None
-    shape = []
-    color = None
+    # _batch and _batch_index are used by batch.BatchPhysics
+    __slots__ = ('_rotation', 'angle', '_velocity', 'shape_archetype', 'color_archetype',
+                 'color', '_shape', '_bbox', '_rotated', 'shape_dirty', 'gui_dirty',
+                 'moved_tick', 'moved_x', 'moved_y', '_batch', '_batch_index')
+
+    kind = 'polygon'
+    saved_attrs = Actor.saved_attrs + ('_rotation', 'angle', '_velocity', 'color')
 
     def __init__(self, game, shape_coords, color):
         super().__init__(game)
-        self.shape_archetype = shape_coords
+        self._rotation = 0
+        self.angle = 0
+        self._velocity = 0
+        # a tuple, so that it can key the rotation cache
+        self.shape_archetype = tuple(shape_coords)
         self.color_archetype = color
         self.color = color
+        # flat list of vertex coords, bounding box, and the RotatedShape for
+        # the current rotation - built when first needed
+        self._shape = array('d')
+        self._bbox = array('d')
+        self._rotated = None
+        self.shape_dirty = True
+        self.gui_dirty = True
+        # last tick move_by() was called, and how far it moved - for swept collisions
+        self.moved_tick = -1
+        self.moved_x = 0.0
+        self.moved_y = 0.0
         self.edge_behaviour = bounce_on_edges
 
+    def _get_shape(self):
+        if self.shape_dirty:
+            self._update_shape()
+        return self._shape
+
+    def _get_bbox(self):
+        if self.shape_dirty:
+            self._update_shape()
+        return self._bbox
+
+    def _get_rotated(self):
+        if self.shape_dirty:
+            self._update_shape()
+        return self._rotated
+
+    def _get_rotation(self):
+        return self._rotation
+
+    def _set_rotation(self, value):
+        if value != self._rotation:
+            self._will_move()
+            self._rotation = value
+
+    def _get_velocity(self):
+        return self._velocity
+
+    def _set_velocity(self, value):
+        self._velocity = value
+        if value and self.asleep:
+            self.game.wake(self)
+
+    shape = property(_get_shape)
+    bbox = property(_get_bbox)
+    rotated = property(_get_rotated)
+    rotation = property(_get_rotation, _set_rotation)
+    velocity = property(_get_velocity, _set_velocity)
+
     def act(self, gui):
-        pr('PolygonActor.act(): name={}'.format(self.name))
+        if TRACE: pr('PolygonActor.act(): name={}', self.name)
         super().act(gui)
-        # move ship (updates shape, bounding box etc)
-        self.move_by(self.angle, self.velocity)
-        # screen edges
-        self.edge_behaviour(gui, self)
+        # move ship, leaving screen edges to the game - or go to sleep if still,
+        # once collisions have been checked where it is
+        if self._velocity:
+            self.move_by(self.angle, self._velocity)
+            self.game.moved.append(self)
+        else:
+            self.game.still.append(self)
+
+    def _will_move(self):
+        "Call before changing position or rotation."
+        # wake first, so as to leave the static hash from where we were
+        if self.asleep:
+            self.game.wake(self)
+        self.shape_dirty = self.gui_dirty = True
+
+    def place(self, x, y):
+        "Set position, in place."
+        self._will_move()
+        p = self._position
+        p[0] = x
+        p[1] = y
+
+    def restored(self):
+        # motion recorded in the abandoned future is no longer true
+        self.moved_tick = -1
 
     def _update_shape(self):
         """Build shape from the archetype, position and rotation. Also updates bounding box."""
-        pr('PolygonActor.update_shape() --- pos={}'.format(self.position))
-        # shape
-        self.shape = []
-        for i in range(0, len(self.shape_archetype), 2):
-            x = self.shape_archetype[i]
-            y = self.shape_archetype[i + 1]
-            vertex = rotate_vertex(x, y, 0, 0, self.rotation)
-            self.shape.append(vertex[0] + self.position[0])
-            self.shape.append(vertex[1] + self.position[1])
+        if TRACE: pr('PolygonActor.update_shape() --- pos={}', self._position)
+        self.game.shape_updates += 1
+        self.shape_dirty = False
+        rotated = self._rotated = rotation_cache.get(self.shape_archetype, self._rotation)
+        offsets = rotated.offsets
+        box = rotated.box
+        x = self._position[0]
+        y = self._position[1]
+        n = len(offsets)
+        # shape - translate the pre-rotated offsets, into the existing buffer
+        shape = self._shape
+        if len(shape) != n:
+            shape = self._shape = array('d', offsets)
+        for i in range(0, n, 2):
+            shape[i] = offsets[i] + x
+            shape[i + 1] = offsets[i + 1] + y
         # bounding box
-        xmin = self.shape[0]
-        xmax = xmin
-        ymin = self.shape[1]
-        ymax = ymin
-        for i in range(0, len(self.shape), 2):
-            x = self.shape[i]
-            y = self.shape[i + 1]
-            if x < xmin: xmin = x
-            if x > xmax: xmax = x
-            if y < ymin: ymin = y
-            if y > ymax: ymax = y
-        self.bbox = [xmin, ymin, xmax, ymax]
-        pr("bbox = {}".format(self.bbox))
+        bbox = self._bbox
+        if len(bbox) != 4:
+            bbox = self._bbox = array('d', box)
+        bbox[0] = box[0] + x
+        bbox[1] = box[1] + y
+        bbox[2] = box[2] + x
+        bbox[3] = box[3] + y
+        if TRACE: pr("bbox = {}", bbox)
 
     def move_by(self, angle, dist):
-        pr('PolygonActor.move_by: {} {}'.format(angle, dist))
+        if TRACE: pr('PolygonActor.move_by: {} {}', angle, dist)
         # self.msg("move: ", self)
-        x = math.sin(math.radians(angle)) * dist
-        y = math.cos(math.radians(angle)) * dist
-        self.position[0] += x
-        self.position[1] += y
-        self._update_shape()
-
+        if not dist:
+            return
+        self._will_move()
+        s, c = sin_cos(angle)
+        x = s * dist
+        y = c * dist
+        p = self._position
+        p[0] += x
+        p[1] += y
+        tick = self.game.tick
+        if self.moved_tick == tick:
+            self.moved_x += x
+            self.moved_y += y
+        else:
+            self.moved_tick = tick
+            self.moved_x = x
+            self.moved_y = y
+
+    @command
     def rotate(self, angle):
         self.rotation = angle
-        self._update_shape()
 
-    def update_gui_shape(self, gui):
-        """Update gui shape based on current actual shape..."""
-        pr('PolygonActor.update_gui_shape()')
-        # if gui_shape already exists, get rid of it
+    def create_gui(self, gui):
+        canvas = gui.get_canvas()
         if self.gui_shape:
-            gui.canvas.delete(self.gui_shape)
-        self.gui_shape = gui.canvas.create_polygon(self.shape, fill=self.color)
-        if self.gui_bbox:
-            gui.canvas.delete(self.gui_bbox)
-        if self.game.show_bounding_boxes:
-            self.gui_bbox = gui.canvas.create_rectangle(self.bbox, outline='yellow')
+            # recycled actor - show the hidden canvas item again
+            canvas.coords(self.gui_shape, *self.shape)
+            canvas.itemconfig(self.gui_shape, fill=self.color, state='normal')
+        else:
+            self.gui_shape = canvas.create_polygon(*self.shape, fill=self.color)
+        self.gui_color = self.color
+        self.gui_dirty = False
 
+    def update_gui_shape(self, gui):
+        """Move existing canvas items to match current shape, in place - if it has changed."""
+        if TRACE: pr('PolygonActor.update_gui_shape()')
+        canvas = gui.get_canvas()
+        moved = self.gui_dirty
+        if moved:
+            canvas.coords(self.gui_shape, *self.shape)
+            self.gui_dirty = False
+        if self.color != self.gui_color:
+            canvas.itemconfig(self.gui_shape, fill=self.color)
+            self.gui_color = self.color
+        # bounding box overlay exists only while boxes are shown
+        if self.game.show_bounding_boxes:
+            if not self.gui_bbox:
+                self.gui_bbox = canvas.create_rectangle(*self.bbox, outline='yellow')
+            elif moved:
+                canvas.coords(self.gui_bbox, *self.bbox)
+        elif self.gui_bbox:
+            canvas.delete(self.gui_bbox)
+            self.gui_bbox = None
+
+    def rasterise(self, renderer):
+        renderer.polygon(self.shape, self.color)
+
+    @command
     def set_velocity(self, n):
         self.velocity = n
 
+    @command
     def set_is_live(self, val):
         self.is_live = val
 
+    @command
     def thrust(self, angle, velocity):
         self.angle = angle
         self.velocity = velocity
 
+    @command
     def move(self, angle, dist):
         self.msg('move: angle={} dist={}'.format(angle, dist))
         self.rotate(angle)
@@ -360,57 +1366,93 @@ class PolygonActor(Actor):
         steps = dist / vel
         self.angle = angle
         self.velocity = vel
-        self.schedule(Job(lambda: self.set_velocity(0), steps))
+        job = Job(lambda: self.set_velocity(0), steps)
+        self.schedule(job)
+        # lets a queued move be waited for until the ship stops
+        return job
 
     # OVERRIDE
     def die(self):
-        self.color = 'red'
-        self.schedule(Job(lambda: self.set_is_live(False), 20))
+        # only one death timer, however many times we are hit while dying
+        if not self.dying:
+            self.dying = True
+            self.color = 'red'
+            self.schedule(Job(self.finish_dying, 20))
+
+    def finish_dying(self):
+        self.dying = False
+        self.is_live = False
 
 class Ship(PolygonActor):
     """A PolygonActor who can shoot missiles and lasers."""
 
+    __slots__ = ()
+
+    kind = 'ship'
+
     def __init__(self, game, color):
         super().__init__(game, [10, -15, 0, 15, -10, -15], color)
 
+    @command
     def missile(self, angle):
         if self.is_live:
             self.msg('missile: angle={}'.format(angle))
             self.rotate(angle)
             x_origin = self.shape[2]
             y_origin = self.shape[3]
-            m = Bullet(self.game, x_origin, y_origin, angle, self)
+            m = self.game.make_projectile(Bullet, x_origin, y_origin, angle, self)
             self.game.add_actor(m)
 
+    @command
     def laser(self, angle):
         if self.is_live:
             self.msg('laser: angle={}'.format(angle))
             self.rotate(angle)
             x_origin = self.shape[2]
             y_origin = self.shape[3]
-            beam = LaserBeam(self.game, x_origin, y_origin, angle, self)
+            beam = self.game.make_projectile(LaserBeam, x_origin, y_origin, angle, self)
             self.game.add_actor(beam)
 
+    @command
     def respawn(self):
         """Bring ship back from the dead."""
         self.is_live = True
+        self.dying = False
         self.color = self.color_archetype
         self.game.add_actor(self)
 
 class LaserBeam(Actor):
     """A static line with limited lifespan which does damage to other actors."""
 
-    line = []
-    lifespan = 20
+    __slots__ = ('parent', 'angle', 'lifespan', 'hit_ids', 'line')
+
+    kind = 'laser'
+    max_lifespan = 20
+    poolable = True
+    # scores go to the parent, so the beam's own isn't saved
+    saved_attrs = ('is_live', 'dying', 'parent', 'angle', 'lifespan', 'hit_ids', 'line')
+    copied_attrs = ('hit_ids', 'line')
 
     def __init__(self, game, x_origin, y_origin, angle, parent):
         super().__init__(game)
+        self.line = array('d', (0.0, 0.0, 0.0, 0.0))
+        self.reset(x_origin, y_origin, angle, parent)
+
+    def reset(self, x_origin, y_origin, angle, parent):
+        "Fire from the origin point - used for new and recycled beams alike."
+        self.is_live = True
         self.parent = parent
         self.angle = angle
+        self.lifespan = self.max_lifespan
+        # ids of actors already hit by this beam
+        self.hit_ids = set()
         dist = 1000
-        x2 = x_origin + (math.sin(math.radians(angle)) * dist)
-        y2 = y_origin + (math.cos(math.radians(angle)) * dist)
-        self.line = [x_origin, y_origin, x2, y2]
+        s, c = sin_cos(angle)
+        ln = self.line
+        ln[0] = x_origin
+        ln[1] = y_origin
+        ln[2] = x_origin + (s * dist)
+        ln[3] = y_origin + (c * dist)
 
     def act(self, gui):
         # count down lifespan
@@ -418,27 +1460,57 @@ class LaserBeam(Actor):
         if self.lifespan <= 0:
             self.is_live = False
 
-    def update_gui_shape(self, gui):
-        # make shape, if it doesn't already exist
-        if not self.gui_shape:
-            ln = self.line
-            self.gui_shape = gui.get_canvas().create_line(ln[0], ln[1], ln[2], ln[3], fill="white")
+    def create_gui(self, gui):
+        ln = self.line
+        canvas = gui.get_canvas()
+        if self.gui_shape:
+            # recycled beam - show the hidden canvas item again
+            canvas.coords(self.gui_shape, *ln)
+            canvas.itemconfig(self.gui_shape, state='normal')
+        else:
+            self.gui_shape = canvas.create_line(ln[0], ln[1], ln[2], ln[3], fill="white")
+
+    def rasterise(self, renderer):
+        renderer.line(self.line, 'white')
+
+    # OVERRIDE
+    def incr_score(self, amt):
+        self.parent.incr_score(amt)
 
 class Bullet(PolygonActor):
     """Bullet starts a little in front of origin point, shoots forward rapidly, and
 dies when it reaches the edge of the screen."""
 
+    __slots__ = ('parent',)
+
+    kind = 'bullet'
+    poolable = True
+    # scores go to the parent, so the bullet's own isn't saved. Nor are its
+    # velocity, which reset() always sets to 10, its rotation, which stays 0,
+    # or its color, which follows dying - see restored()
+    saved_attrs = ('is_live', 'dying', 'angle', 'parent')
+
     def __init__(self, game, x, y, angle, parent):
         super().__init__(game, [3,3, 3,-3, -3,-3, -3,3], "white")
+        self.edge_behaviour = die_on_edges
+        self.reset(x, y, angle, parent)
+
+    def reset(self, x, y, angle, parent):
+        "Launch from (x, y) - used for new and recycled bullets alike."
+        self.is_live = True
+        self.dying = False
+        self.color = self.color_archetype
         self.parent = parent
         self.angle = angle
         self.velocity = 10
-        self.edge_behaviour = die_on_edges
         # position a little in front, so we don't collide with nose of ship
         dist = 30
-        x2 = math.sin(math.radians(angle)) * dist
-        y2 = math.cos(math.radians(angle)) * dist
-        self.position = [x + x2, y + y2]
+        s, c = sin_cos(angle)
+        self.place(x + s * dist, y + c * dist)
+
+    def restored(self):
+        super().restored()
+        self.color = 'red' if self.dying else self.color_archetype
 
     # OVERRIDE
     def incr_score(self, amt):
@@ -0,0 +1,33 @@
+# SPES: Starship Programming Edutainment System --- EXAMPLE BOTS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Strategies for tournament.py. A strategy is a function which is called once
+# per tick, before the game is stepped, as:
+#
+#     strategy(game, p)
+#
+# Use game.random rather than the random module, so that a match can be
+# repeated exactly from its seed.
+
+import user
+
+def turret(game, p):
+    "Stay put and fire a spread of missiles every 50 ticks."
+    if game.tick % 50 == 0:
+        user.spread_fire(p, game.tick % 360, 90, 6)
+
+def wanderer(game, p):
+    "Keep moving in random directions, firing a laser now and then."
+    if game.tick % 100 == 0:
+        p.move(game.random.randint(0, 359), 150)
+    if game.tick % 30 == 0:
+        p.laser(game.random.randint(0, 359))
+
+def sitting_duck(game, p):
+    "Do nothing at all - a baseline to compare the others against."
+    pass
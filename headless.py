@@ -0,0 +1,128 @@
+# SPES: Starship Programming Edutainment System --- HEADLESS FRONTEND
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# SPES HEADLESS FRONTEND
+#
+# Runs the game engine without a display and as fast as possible - useful for
+# evaluating user strategies over many thousands of ticks.
+#
+# EXAMPLE:
+#
+#     from engine import Game
+#     from headless import fast_forward
+#     import user
+#
+#     game = Game()
+#     user.spread_fire(game.player, 90, 60, 5)
+#     result = fast_forward(game, ticks=10000, until=lambda g: not g.player.is_live)
+#     print(format_result(result))
+
+from engine import Game
+import user
+
+from time import perf_counter
+
+class HeadlessCanvas(object):
+    """Accepts the canvas calls made by the engine and draws nothing."""
+
+    def create_polygon(self, *args, **kw):
+        return 1
+
+    def create_rectangle(self, *args, **kw):
+        return 1
+
+    def create_line(self, *args, **kw):
+        return 1
+
+    def coords(self, *args):
+        pass
+
+    def itemconfig(self, *args, **kw):
+        pass
+
+    def delete(self, *args):
+        pass
+
+    def find_all(self):
+        return ()
+
+class HeadlessGUI(object):
+    """Public interface:
+
+    get_width()
+    get_height()
+    get_canvas()
+    set_info_text(text)
+    renderer - optional: a renderer.RasterRenderer, or None to draw with canvas items
+    """
+
+    renderer = None
+
+    def __init__(self, width=800, height=800):
+        self.width = width
+        self.height = height
+        self.canvas = HeadlessCanvas()
+        self.info_text = ''
+
+    #### PUBLIC INTERFACE ####
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def get_canvas(self):
+        return self.canvas
+
+    def set_info_text(self, text):
+        self.info_text = text
+
+def fast_forward(game, ticks=1000, until=None, gui=None):
+    """Run game.iterate_loop() back-to-back for up to ticks iterations.
+
+    If until is given it is called as until(game) after each tick, and the run
+    stops as soon as it returns True.
+
+    Returns a dict with keys: ticks, seconds, ticks_per_second, score
+
+    Automatic snapshots are switched off, as nobody is there to rewind.
+    """
+    if gui is None:
+        gui = HeadlessGUI()
+    game.snapshot_every = 0
+    game.setup(gui)
+    done = 0
+    start = perf_counter()
+    while done < ticks:
+        game.iterate_loop(gui)
+        done += 1
+        if until and until(game):
+            break
+    elapsed = perf_counter() - start
+    return {'ticks': done,
+            'seconds': elapsed,
+            'ticks_per_second': done / elapsed if elapsed > 0 else 0.0,
+            'score': game.player.score}
+
+def format_result(result):
+    return 'ticks: {} in {:.2f}s ({:.1f} ticks/s)\nscore: {}'.format(
+        result['ticks'], result['seconds'], result['ticks_per_second'], result['score'])
+
+###################### TOP LEVEL USER INTERFACE ######################
+
+if __name__ == '__main__':
+    game = Game()
+    game.player.quiet_mode = True
+
+    def volley_every_100_ticks(game):
+        if game.player.is_live and game.tick % 100 == 0:
+            user.spread_fire(game.player, 90, 90, 6)
+        return not game.player.is_live
+
+    print(format_result(fast_forward(game, ticks=10000, until=volley_every_100_ticks)))
@@ -0,0 +1,97 @@
+# SPES: Starship Programming Edutainment System --- GAME LOOP SCHEDULER
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Fixed-timestep scheduling for the GUI frontends.
+#
+# The simulation always advances in steps of dt seconds, however long drawing
+# takes. Real elapsed time is collected in an accumulator and paid out as
+# whole simulation steps - several per frame if the GUI has fallen behind.
+# When even that can't keep up, rendering is skipped for a few frames to give
+# the simulation the time instead.
+
+from collections import deque
+from time import perf_counter
+
+class FixedStepScheduler(object):
+    """Decides when to step and when to render a game engine.
+
+    Call advance(engine, gui) from the GUI's timer callback, then schedule the
+    next callback after next_delay_ms() milliseconds.
+    """
+
+    def __init__(self, dt=0.05, max_steps=5, max_skipped_renders=3):
+        self.dt = dt
+        self.max_steps = max_steps
+        self.max_skipped_renders = max_skipped_renders
+        self.accumulator = 0.0
+        self.last_time = None
+        self.skipped_in_a_row = 0
+        # counters
+        self.steps = 0
+        self.renders = 0
+        self.renders_skipped = 0
+        self.render_times = deque(maxlen=20)
+        self.step_times = deque(maxlen=100)
+
+    def advance(self, engine, gui, now=None):
+        """Run any simulation steps which are due, then render unless behind.
+
+        Returns the number of simulation steps run.
+        """
+        if now is None:
+            now = perf_counter()
+        if self.last_time is None:
+            self.last_time = now - self.dt
+        self.accumulator += now - self.last_time
+        self.last_time = now
+        # simulate
+        steps = 0
+        while self.accumulator >= self.dt and steps < self.max_steps:
+            engine.step(gui)
+            self.accumulator -= self.dt
+            self.step_times.append(now)
+            steps += 1
+        self.steps += steps
+        if steps == 0:
+            return 0
+        # render, or skip rendering if still behind
+        behind = self.accumulator >= self.dt
+        if behind and self.skipped_in_a_row < self.max_skipped_renders:
+            self.skipped_in_a_row += 1
+            self.renders_skipped += 1
+        else:
+            if behind:
+                # can't catch up - drop the backlog rather than spiral
+                self.accumulator %= self.dt
+            self.skipped_in_a_row = 0
+            engine.render(gui)
+            self.renders += 1
+            self.render_times.append(now)
+        return steps
+
+    def next_delay_ms(self):
+        "Milliseconds until the next simulation step is due."
+        return max(1, int((self.dt - self.accumulator) * 1000))
+
+    def fps(self):
+        "Rendered frames per second, averaged over recent frames."
+        return rate(self.render_times)
+
+    def tps(self):
+        "Simulation ticks per second, averaged over recent ticks."
+        return rate(self.step_times)
+
+    def info_text(self):
+        return 'fps: {:.2f}  ticks/s: {:.2f}  skipped renders: {}\n'.format(
+            self.fps(), self.tps(), self.renders_skipped)
+
+def rate(times):
+    "Events per second for a sequence of event timestamps."
+    if len(times) < 2 or times[-1] == times[0]:
+        return 0.0
+    return (len(times) - 1) / (times[-1] - times[0])
@@ -0,0 +1,155 @@
+# SPES: Starship Programming Edutainment System --- PROFILER
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Finds out where the game loop spends its time.
+#
+# From the REPL or the editor:
+#
+#     game.profile()                # start collecting timings
+#     game.profile(cprofile=200)    # ...and run cProfile over the next 200 ticks
+#     print(game.profiler.histogram('collisions'))
+#     print(game.profiler.histogram('act', 'bullet'))
+#     game.stop_profiling()
+#
+# While profiling, the game's info text shows the biggest costs, per phase and
+# per actor kind, over the last window of ticks. When it isn't profiling the
+# game pays nothing for any of this beyond checking game.profiler is None.
+#
+# For step by step tracing of the engine, set engine.TRACE = True.
+
+import cProfile
+import io
+import pstats
+
+class Histogram(object):
+    """Counts timings in buckets which double in width, from 1 microsecond up."""
+
+    num_buckets = 24
+
+    def __init__(self):
+        self.buckets = [0] * self.num_buckets
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        # bucket i holds timings from 2**(i-1) up to 2**i microseconds
+        i = min(int(seconds * 1e6).bit_length(), self.num_buckets - 1)
+        self.buckets[i] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Returns the upper edge, in seconds, of the bucket holding that fraction of timings."""
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return (1 << i) / 1e6
+        return 0.0
+
+    def text(self, width=40):
+        """Returns the histogram drawn as bars of '#', one line per non-empty bucket."""
+        if not self.count:
+            return '(no timings)'
+        biggest = max(self.buckets)
+        lines = []
+        for i, n in enumerate(self.buckets):
+            if n:
+                bar = '#' * max(1, n * width // biggest)
+                lines.append('<{:>9}us {:>7} {}'.format(1 << i, n, bar))
+        lines.append('count {}  mean {:.1f}us  p99 <{:.0f}us'.format(
+            self.count, self.mean() * 1e6, self.percentile(0.99) * 1e6))
+        return '\n'.join(lines)
+
+class Profiler(object):
+    """Timing histograms for each phase of the game loop, and optionally for
+    each kind of actor within the 'act' and 'draw' phases, plus cProfile
+    captures of a number of ticks.
+
+    Histograms keep everything since profiling started. The overlay shows
+    totals over the last complete window of ticks, so it follows what is
+    happening now.
+    """
+
+    def __init__(self, per_actor=True, window=60):
+        self.per_actor = per_actor
+        self.window = window
+        # (phase, kind or None) -> Histogram
+        self.histograms = {}
+        # total seconds per key this window, and in the last complete one
+        self.current = {}
+        self.last = {}
+        self.ticks = 0
+        self.cprofile = None
+        self.capture_ticks = 0
+        self.stats_text = ''
+
+    def record(self, phase, seconds, kind=None):
+        key = (phase, kind)
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = Histogram()
+        h.add(seconds)
+        self.current[key] = self.current.get(key, 0.0) + seconds
+
+    def histogram(self, phase, kind=None):
+        """Returns a histogram as text, e.g. histogram('action') or histogram('act', 'bullet')."""
+        h = self.histograms.get((phase, kind))
+        return h.text() if h else '(no timings for {} {})'.format(phase, kind or '')
+
+    #### CPROFILE ####
+
+    def capture(self, ticks):
+        """Run cProfile over the next number of ticks.
+
+        Profiling starts and stops on the game's own thread, so this is safe to
+        call from the REPL.
+        """
+        self.capture_ticks = ticks
+
+    def before_step(self):
+        if self.capture_ticks and self.cprofile is None:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def after_step(self):
+        self.ticks += 1
+        if self.ticks % self.window == 0:
+            self.last = self.current
+            self.current = {}
+        if self.cprofile is not None:
+            self.capture_ticks -= 1
+            if self.capture_ticks <= 0:
+                self.cprofile.disable()
+                out = io.StringIO()
+                pstats.Stats(self.cprofile, stream=out).sort_stats('cumulative').print_stats(20)
+                self.stats_text = out.getvalue()
+                self.cprofile = None
+                print(self.stats_text)
+
+    #### OVERLAY ####
+
+    def top(self, n=5):
+        """Returns [(label, milliseconds per tick)] for the biggest costs last window."""
+        totals = self.last or self.current
+        ticks = self.window if self.last else max(1, self.ticks % self.window)
+        ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+        return [(phase if kind is None else '{} {}'.format(phase, kind), total / ticks * 1000)
+                for (phase, kind), total in ranked[:n]]
+
+    def overlay_text(self, n=5):
+        lines = ['top costs (ms/tick)']
+        for label, ms in self.top(n):
+            lines.append('{:<18}{:>7.2f}'.format(label, ms))
+        if self.cprofile is not None:
+            lines.append('cProfile: {} ticks to go'.format(self.capture_ticks))
+        return '\n'.join(lines)
@@ -0,0 +1,419 @@
+# SPES: Starship Programming Edutainment System --- RENDER PROCESS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Draws the game in a process of its own.
+#
+# With the command line frontend, Tk drawing, the game loop and the
+# interpreter normally share one Python process, and so one GIL - heavy
+# drawing slows the game down and vice versa. Started with:
+#
+#     $ python -i spes_cmd.py --render-process
+#
+# the game runs on a thread of the interpreter's process, without Tk. Each
+# frame, the state of every actor (id, kind, colour, vertices and bounding
+# box) is written into a double buffer in shared memory. A separate viewer
+# process reads the latest complete frame whenever it is ready and draws it,
+# so neither side ever waits for the other.
+#
+# SHARED MEMORY LAYOUT:
+#
+#     header        HEADER_FIELDS, as 64 bit ints
+#     names         kind and colour names, newline separated, only ever added to
+#     frame 0, 1    tick, length of info text and number of floats, as 64 bit
+#                   ints - then the info text, then the floats
+#
+# Each actor is a record of floats:
+#
+#     id, kind, colour, is_line, x1, y1, x2, y2, n, then n coordinates
+#
+# where kind and colour index the names, and the box is NaN unless bounding
+# boxes are shown.
+#
+# The writer fills whichever frame is not the latest, then makes it the
+# latest. Each frame has a sequence number which is odd while it is being
+# written, so a reader can tell if a frame changed under it and read again.
+
+from headless import HeadlessCanvas
+from loop import FixedStepScheduler
+
+import multiprocessing
+import struct
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+
+HEADER_FIELDS = ('latest', 'seq0', 'seq1', 'names_len', 'width', 'height', 'closed', 'max_floats')
+LATEST, SEQ0, SEQ1, NAMES_LEN, WIDTH, HEIGHT, CLOSED, MAX_FLOATS = range(len(HEADER_FIELDS))
+HEADER_SIZE = 8 * len(HEADER_FIELDS)
+NAMES_SIZE = 1 << 16
+TEXT_SIZE = 1 << 12
+FRAME_HEADER = struct.Struct('<3q')
+RECORD_HEADER = 9
+NO_BOX = (float('nan'),) * 4
+
+class SharedFrames(object):
+    """Two frames of actor state in shared memory - the latest complete one,
+    and the one being written.
+
+    Made with no name, creates new shared memory. Given the name of existing
+    shared memory, attaches to it.
+    """
+
+    def __init__(self, name=None, max_floats=1 << 19):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self._size(max_floats))
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self.header = buf[:HEADER_SIZE].cast('q')
+        if self.owner:
+            self.header[MAX_FLOATS] = max_floats
+        self.max_floats = self.header[MAX_FLOATS]
+        self.names = buf[HEADER_SIZE:HEADER_SIZE + NAMES_SIZE]
+        self.frame_size = FRAME_HEADER.size + TEXT_SIZE + 8 * self.max_floats
+        start = HEADER_SIZE + NAMES_SIZE
+        self.frames = [buf[start + i * self.frame_size:start + (i + 1) * self.frame_size]
+                       for i in (0, 1)]
+        self.floats = [f[FRAME_HEADER.size + TEXT_SIZE:].cast('d') for f in self.frames]
+        # names known so far, and how many bytes of the names region they use
+        self.name_list = []
+        self.names_len = 0
+
+    @staticmethod
+    def _size(max_floats):
+        return HEADER_SIZE + NAMES_SIZE + 2 * (FRAME_HEADER.size + TEXT_SIZE + 8 * max_floats)
+
+    def close(self):
+        "Let go of the shared memory - and free it, if this made it."
+        views = self.floats + self.frames + [self.names, self.header]
+        self.floats = self.frames = self.names = self.header = None
+        for view in views:
+            view.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    #### WRITING ####
+
+    def add_name(self, name):
+        "Add a name to the shared list, returning its index."
+        data = name.encode() + b'\n'
+        end = self.names_len + len(data)
+        if end > NAMES_SIZE:
+            raise ValueError('no room left for name: {}'.format(name))
+        self.names[self.names_len:end] = data
+        self.names_len = end
+        self.name_list.append(name)
+        # publish only once the bytes are in place
+        self.header[NAMES_LEN] = end
+        return len(self.name_list) - 1
+
+    def write(self, tick, text, floats):
+        "Write a frame, then make it the latest."
+        header = self.header
+        i = 1 - header[LATEST]
+        seq = SEQ0 + i
+        header[seq] += 1
+        frame = self.frames[i]
+        data = text.encode()[:TEXT_SIZE]
+        FRAME_HEADER.pack_into(frame, 0, tick, len(data), len(floats))
+        frame[FRAME_HEADER.size:FRAME_HEADER.size + len(data)] = data
+        self.floats[i][:len(floats)] = floats
+        header[seq] += 1
+        header[LATEST] = i
+
+    #### READING ####
+
+    def read(self, last=None):
+        """Returns (key, tick, text, floats) for the latest complete frame, or
+        None if it is the one whose key is last."""
+        header = self.header
+        while True:
+            i = header[LATEST]
+            seq = header[SEQ0 + i]
+            if seq & 1:
+                # the writer has lapped us - look again
+                continue
+            if (i, seq) == last:
+                return None
+            frame = self.frames[i]
+            tick, text_len, n = FRAME_HEADER.unpack_from(frame, 0)
+            text = bytes(frame[FRAME_HEADER.size:FRAME_HEADER.size + text_len])
+            floats = self.floats[i][:n].tolist()
+            if header[SEQ0 + i] == seq:
+                return (i, seq), tick, text.decode(errors='replace'), floats
+
+    def read_names(self):
+        "Returns the list of names, bringing it up to date if any have been added."
+        end = self.header[NAMES_LEN]
+        if end > self.names_len:
+            new = bytes(self.names[self.names_len:end]).decode()
+            self.name_list.extend(new.split('\n')[:-1])
+            self.names_len = end
+        return self.name_list
+
+    #### VIEWER TO GAME ####
+
+    def size(self):
+        return self.header[WIDTH], self.header[HEIGHT]
+
+    def set_size(self, width, height):
+        self.header[WIDTH] = width
+        self.header[HEIGHT] = height
+
+    def closed(self):
+        return bool(self.header[CLOSED])
+
+    def set_closed(self):
+        self.header[CLOSED] = 1
+
+def records(floats):
+    "Yields (id, kind, colour, is_line, box, coords) for each actor in a frame's floats."
+    i = 0
+    end = len(floats)
+    while i < end:
+        n = int(floats[i + 8])
+        start = i + RECORD_HEADER
+        yield (int(floats[i]), int(floats[i + 1]), int(floats[i + 2]), floats[i + 3] != 0,
+               floats[i + 4:i + 8], floats[start:start + n])
+        i = start + n
+
+########################### THE GAME SIDE ############################
+
+class FrameWriter(object):
+    """Used as a GUI's renderer, but writes each frame into SharedFrames
+    instead of drawing it.
+
+    Actors describe themselves through polygon() and line(), from their
+    rasterise method, as they do for renderer.RasterRenderer.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.out = array('d')
+        # name -> index in the shared names
+        self.names = {}
+        self.actor = None
+        self.boxes = False
+        self.text = ''
+        # actors left out because a frame was full
+        self.dropped = 0
+
+    def name_index(self, name):
+        i = self.names.get(name)
+        if i is None:
+            i = self.names[name] = self.frames.add_name(name)
+        return i
+
+    def polygon(self, coords, color):
+        self._record(coords, color, 0.0)
+
+    def line(self, coords, color):
+        self._record(coords[:4], color, 1.0)
+
+    def _record(self, coords, color, is_line):
+        a = self.actor
+        out = self.out
+        if len(out) + RECORD_HEADER + len(coords) > self.frames.max_floats:
+            self.dropped += 1
+            return
+        out.extend((a.id, self.name_index(a.kind), self.name_index(color), is_line))
+        out.extend(a.bbox if self.boxes and a.bbox else NO_BOX)
+        out.append(len(coords))
+        out.extend(coords)
+
+    def render(self, game):
+        out = self.out
+        del out[:]
+        self.boxes = game.show_bounding_boxes
+        for a in game.actors:
+            self.actor = a
+            a.rasterise(self)
+        self.actor = None
+        self.frames.write(game.tick, self.text, out)
+
+class ProcessGUI(threading.Thread):
+    """Runs the game on a thread of its own, drawn by a viewer process.
+
+    Public interface:
+
+    get_width()
+    get_height()
+    get_canvas()
+    set_info_text(text)
+    renderer - a FrameWriter
+    """
+
+    game_running = True
+    restart_with_game_engine = None
+    width = 800
+    height = 800
+    renderer = None
+
+    def __init__(self, engine):
+        threading.Thread.__init__(self)
+        self.engine = engine
+        self.scheduler = FixedStepScheduler()
+        # actors' own canvas items go nowhere
+        self.canvas = HeadlessCanvas()
+        self.frames = None
+        self.viewer = None
+
+    def run(self):
+        # on thread starting
+        self.engine.commands.claim()
+        self.frames = SharedFrames()
+        self.frames.set_size(self.width, self.height)
+        self.renderer = FrameWriter(self.frames)
+        # a fresh interpreter, rather than a fork of this one and its threads
+        context = multiprocessing.get_context('spawn')
+        self.viewer = context.Process(target=run_viewer, args=(self.frames.name,), daemon=True)
+        self.viewer.start()
+        self.engine.setup(self)
+        try:
+            self.game_loop()
+        finally:
+            if self.engine.recorder:
+                self.engine.recorder.close()
+            self.frames.set_closed()
+            self.viewer.join(timeout=2)
+            self.frames.close()
+            print('Goodbye!\n')
+
+    def game_loop(self):
+        # stops when the viewer's window is closed, or it has died
+        while self.game_running and not self.frames.closed() and self.viewer.is_alive():
+            if self.restart_with_game_engine:
+                # commands already queued go to the new game
+                self.restart_with_game_engine.commands = self.engine.commands
+                self.engine = self.restart_with_game_engine
+                self.restart_with_game_engine = None
+                self.engine.setup(self)
+            # follow the viewer's window size
+            size = self.frames.size()
+            if size != (self.width, self.height):
+                self.width, self.height = size
+                self.engine.resize(self.width, self.height)
+            self.scheduler.advance(self.engine, self)
+            time.sleep(self.scheduler.next_delay_ms() / 1000)
+
+    def exit(self):
+        self.game_running = False
+
+    #### PUBLIC INTERFACE ####
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def get_canvas(self):
+        return self.canvas
+
+    def set_info_text(self, text):
+        # goes out with the next frame
+        self.renderer.text = self.scheduler.info_text() + text
+
+########################## THE VIEWER SIDE ###########################
+
+class FrameViewer(object):
+    """Draws frames from SharedFrames on a Tk canvas, in the viewer process.
+
+    Keeps one canvas item per actor, moving it only when its vertices have
+    changed.
+    """
+
+    delay_ms = 15
+    bbox_color = 'yellow'
+
+    def __init__(self, name):
+        import tkinter as tk
+        self.root = tk.Tk()
+        self.root.title("game")
+        self.frames = SharedFrames(name)
+        width, height = self.frames.size()
+        self.canvas = tk.Canvas(self.root, bg='blue', width=width, height=height)
+        self.canvas.bind('<Configure>', self.on_resize)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.info = self.canvas.create_text(10, 20, anchor=tk.NW, text="info", fill="white")
+        self.root.protocol('WM_DELETE_WINDOW', self.close)
+        # (actor id, kind, is_line) -> [item, colour, coords, bbox item] - ids
+        # can come back as another kind of actor after a snapshot is restored
+        self.items = {}
+        self.last = None
+
+    def run(self):
+        self.root.after(self.delay_ms, self.draw)
+        self.root.mainloop()
+        self.frames.close()
+
+    def on_resize(self, event):
+        self.frames.set_size(event.width, event.height)
+
+    def close(self):
+        self.frames.set_closed()
+        self.root.destroy()
+
+    def draw(self):
+        if self.frames.closed():
+            self.root.destroy()
+            return
+        frame = self.frames.read(self.last)
+        if frame:
+            self.last, tick, text, floats = frame
+            self.draw_frame(text, floats)
+        self.root.after(self.delay_ms, self.draw)
+
+    def draw_frame(self, text, floats):
+        canvas = self.canvas
+        names = self.frames.read_names()
+        items = self.items
+        seen = set()
+        for actor_id, kind, color, is_line, box, coords in records(floats):
+            key = (actor_id, kind, is_line)
+            seen.add(key)
+            color = names[color]
+            entry = items.get(key)
+            if entry is None:
+                if is_line:
+                    item = canvas.create_line(*coords, fill=color)
+                else:
+                    item = canvas.create_polygon(*coords, fill=color)
+                entry = items[key] = [item, color, coords, None]
+            else:
+                if coords != entry[2]:
+                    canvas.coords(entry[0], *coords)
+                    entry[2] = coords
+                if color != entry[1]:
+                    canvas.itemconfig(entry[0], fill=color)
+                    entry[1] = color
+            # NaN unless the game is showing bounding boxes
+            if box[0] == box[0]:
+                if entry[3]:
+                    canvas.coords(entry[3], *box)
+                else:
+                    entry[3] = canvas.create_rectangle(*box, outline=self.bbox_color)
+            elif entry[3]:
+                canvas.delete(entry[3])
+                entry[3] = None
+        for key in [k for k in items if k not in seen]:
+            entry = items.pop(key)
+            canvas.delete(entry[0])
+            if entry[3]:
+                canvas.delete(entry[3])
+        canvas.itemconfig(self.info, text=text)
+        canvas.tag_raise(self.info)
+
+def run_viewer(name):
+    "Entry point of the viewer process."
+    FrameViewer(name).run()
@@ -0,0 +1,217 @@
+# SPES: Starship Programming Edutainment System --- RASTER RENDERER
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Alternative way of drawing the game, for big matches.
+#
+# Normally every actor has canvas items of its own, which Tk has to keep up to
+# date - with hundreds of bullets that costs more than the game itself. A
+# RasterRenderer instead draws every actor into one offscreen image each frame,
+# then puts the whole image on the canvas in one go, as a single PhotoImage.
+#
+# Uses Pillow to draw if it is installed, otherwise draws into a plain
+# bytearray. Switch it on when making a GUI, with:
+#
+#     $ python spes_builtin.py --raster
+#     $ python -i spes_cmd.py --raster
+
+import tkinter as tk
+
+try:
+    from PIL import Image, ImageDraw, ImageTk
+except ImportError:
+    Image = None
+
+class Framebuffer(object):
+    """An RGB image in a bytearray, with just enough drawing to show the game."""
+
+    def __init__(self, width, height, background):
+        self.width = width
+        self.height = height
+        self.blank = bytes(background) * (width * height)
+        self.data = bytearray(self.blank)
+        self.header = 'P6 {} {} 255\n'.format(width, height).encode()
+
+    def clear(self):
+        self.data[:] = self.blank
+
+    def polygon(self, coords, rgb):
+        """Fill a polygon given as flat coordinates [x0, y0, x1, y1 ...].
+
+        Fills the pixels whose centres are inside. Each edge adds its crossing
+        of each row it spans, then the rows are filled between crossings.
+        """
+        n = len(coords)
+        ys = coords[1::2]
+        top = max(0, int(min(ys) + 0.5))
+        bottom = min(self.height, int(max(ys) + 0.5))
+        if top >= bottom:
+            return
+        crossings = [[] for row in range(top, bottom)]
+        x0 = coords[n - 2]
+        y0 = coords[n - 1]
+        for i in range(0, n, 2):
+            x1 = coords[i]
+            y1 = coords[i + 1]
+            if y0 != y1:
+                if y0 < y1:
+                    xa, ya, yb = x0, y0, y1
+                else:
+                    xa, ya, yb = x1, y1, y0
+                # rows whose centres are in [ya, yb)
+                first = max(top, int(ya + 0.5))
+                last = min(bottom, int(yb + 0.5))
+                if first < last:
+                    slope = (x1 - x0) / (y1 - y0)
+                    x = xa + (first + 0.5 - ya) * slope
+                    for row in range(first - top, last - top):
+                        crossings[row].append(x)
+                        x += slope
+            x0 = x1
+            y0 = y1
+        width = self.width
+        data = self.data
+        color = bytes(rgb)
+        offset = top * width * 3
+        for xs in crossings:
+            if len(xs) == 2:
+                a, b = xs
+                if a > b:
+                    a, b = b, a
+                pairs = ((a, b),)
+            else:
+                xs.sort()
+                pairs = zip(xs[::2], xs[1::2])
+            for a, b in pairs:
+                start = max(0, int(a + 0.5))
+                end = min(width, int(b + 0.5))
+                if start < end:
+                    data[offset + start * 3:offset + end * 3] = color * (end - start)
+            offset += width * 3
+
+    def line(self, coords, rgb):
+        """Draw a one pixel wide line from (coords[0], coords[1]) to (coords[2], coords[3])."""
+        x0, y0, x1, y1 = coords[0], coords[1], coords[2], coords[3]
+        steps = int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+        dx = (x1 - x0) / steps
+        dy = (y1 - y0) / steps
+        width = self.width
+        height = self.height
+        data = self.data
+        color = bytes(rgb)
+        x = x0
+        y = y0
+        for i in range(steps + 1):
+            px = int(x)
+            py = int(y)
+            if 0 <= px < width and 0 <= py < height:
+                offset = (py * width + px) * 3
+                data[offset:offset + 3] = color
+            x += dx
+            y += dy
+
+    def rectangle(self, box, rgb):
+        "Outline a box (x1, y1, x2, y2)."
+        x1, y1, x2, y2 = box[0], box[1], box[2], box[3]
+        for coords in ((x1, y1, x2, y1), (x2, y1, x2, y2), (x2, y2, x1, y2), (x1, y2, x1, y1)):
+            self.line(coords, rgb)
+
+    def ppm(self):
+        "Returns the image as binary PPM data, which Tk's PhotoImage can read."
+        return self.header + self.data
+
+class PillowFramebuffer(object):
+    """The same as Framebuffer, drawn by Pillow."""
+
+    def __init__(self, width, height, background):
+        self.width = width
+        self.height = height
+        self.background = tuple(background)
+        self.image = Image.new('RGB', (width, height), self.background)
+        self.draw = ImageDraw.Draw(self.image)
+
+    def clear(self):
+        self.image.paste(self.background, (0, 0, self.width, self.height))
+
+    def polygon(self, coords, rgb):
+        self.draw.polygon(list(coords), fill=rgb)
+
+    def line(self, coords, rgb):
+        self.draw.line(list(coords[:4]), fill=rgb)
+
+    def rectangle(self, box, rgb):
+        self.draw.rectangle(list(box), outline=rgb)
+
+class RasterRenderer(object):
+    """Draws the game into a framebuffer, shown on a Tk canvas as one PhotoImage.
+
+    Actors draw themselves through polygon() and line(), from their rasterise
+    method. Colours are named as for the canvas.
+    """
+
+    background = 'blue'
+    bbox_color = 'yellow'
+
+    def __init__(self, canvas, width, height, pillow=True):
+        self.canvas = canvas
+        self.pillow = pillow and Image is not None
+        # colour name -> (r, g, b)
+        self.colors = {}
+        self.item = None
+        self.resize(width, height)
+
+    def rgb(self, name):
+        "Returns (r, g, b) for a Tk colour name, asking Tk only once per colour."
+        rgb = self.colors.get(name)
+        if rgb is None:
+            # Tk gives 16 bits per channel
+            rgb = self.colors[name] = tuple(c >> 8 for c in self.canvas.winfo_rgb(name))
+        return rgb
+
+    def resize(self, width, height):
+        "Start again with a framebuffer and image of a new size."
+        width = max(1, width)
+        height = max(1, height)
+        background = self.rgb(self.background)
+        if self.pillow:
+            self.fb = PillowFramebuffer(width, height, background)
+            self.photo = ImageTk.PhotoImage(self.fb.image)
+        else:
+            self.fb = Framebuffer(width, height, background)
+            self.photo = tk.PhotoImage(width=width, height=height)
+        if self.item is None:
+            self.item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+            # keep the info text on top
+            self.canvas.tag_lower(self.item)
+        else:
+            self.canvas.itemconfig(self.item, image=self.photo)
+
+    def polygon(self, coords, color):
+        self.fb.polygon(coords, self.rgb(color))
+
+    def line(self, coords, color):
+        self.fb.line(coords, self.rgb(color))
+
+    def render(self, game):
+        """Draw every actor - and bounding boxes, if the game is showing them -
+        and put the result on the canvas."""
+        fb = self.fb
+        fb.clear()
+        for a in game.actors:
+            a.rasterise(self)
+        if game.show_bounding_boxes:
+            rgb = self.rgb(self.bbox_color)
+            for a in game.actors:
+                if a.bbox:
+                    fb.rectangle(a.bbox, rgb)
+        self.present()
+
+    def present(self):
+        if self.pillow:
+            self.photo.paste(self.fb.image)
+        else:
+            self.photo.configure(data=self.fb.ppm(), format='PPM')
@@ -0,0 +1,212 @@
+# SPES: Starship Programming Edutainment System --- RECORD & REPLAY
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Record a game as it is played, then replay it headlessly at full speed.
+#
+# A game is fully determined by its seed, its settings, the size of the arena
+# and the commands given to the actors, so that is all the log holds. The log
+# is a text file with one JSON value per line - a header and then events, each
+# stamped with the tick they happened on:
+#
+#     {"spes_log": 1, "seed": 1234, "broadphase": "sap", "narrow_phase": true, ...}
+#     [0, "size", 800, 800]
+#     [0, "settings", {"broadphase": "sap", "batch_physics": true, ...}]
+#     [57, "cmd", "p", "move", [45, 200]]
+#     [100, "hash", "3f2a..."]
+#     [412, "end"]
+#
+# Hashes of the game state are written every so often and checked on replay,
+# so a replay which drifts from the original is caught near where it drifts.
+#
+# RECORDING (before the game starts running):
+#
+#     rec = Recorder('match.log').attach(game)
+#     ...
+#     rec.close()
+#
+# REPLAYING:
+#
+#     $ python replay.py match.log
+
+from headless import HeadlessGUI, format_result
+from engine import Game
+
+import hashlib
+import json
+import sys
+from time import perf_counter
+
+LOG_VERSION = 1
+
+class ReplayMismatch(Exception):
+    """The replayed game state differs from the recording."""
+    pass
+
+def state_hash(game):
+    """Returns a hex digest of everything which affects how the game goes on."""
+    actors = []
+    for a in game.actors:
+        position = getattr(a, 'line', None) or a._position
+        actors.append((a.id, a.kind, [float(v) for v in position],
+                       getattr(a, 'angle', 0), getattr(a, 'velocity', 0),
+                       a.is_live, a.dying, a.score))
+    state = (game.tick, actors, game.random.getstate())
+    return hashlib.sha1(repr(state).encode()).hexdigest()
+
+def game_settings(game):
+    """Returns the settings which change how a game goes, as a dict."""
+    return {'broadphase': game.broadphase,
+            'narrow_phase': game.narrow_phase,
+            'grid_cell_size': game.grid_cell_size,
+            'num_drones': game.num_drones,
+            'batch_physics': game.physics is not None}
+
+def apply_settings(game, settings):
+    """Change game's settings to those given - which may be only some of them."""
+    for name in ('broadphase', 'narrow_phase', 'grid_cell_size', 'num_drones'):
+        if name in settings:
+            setattr(game, name, settings[name])
+    if 'batch_physics' in settings:
+        game.use_batch_physics(settings['batch_physics'])
+
+class Recorder(object):
+    """Appends a game's seed, settings, arena size changes and commands to a
+    log file."""
+
+    # commands currently being run - nested commands are not logged
+    depth = 0
+
+    def __init__(self, path, hash_every=100):
+        self.path = path
+        self.hash_every = hash_every
+        self.file = None
+        self.game = None
+        self.size = None
+        self.settings = None
+
+    def attach(self, game):
+        """Start recording game, which must not have started running yet."""
+        if game.tick != 0:
+            raise ValueError('recording must start before the first tick')
+        self.game = game
+        self.file = open(self.path, 'w')
+        # settings like the broadphase decide which collisions are found, so
+        # are part of the game - and are logged again whenever they change
+        self.settings = game_settings(game)
+        header = {'spes_log': LOG_VERSION, 'seed': game.seed}
+        header.update(self.settings)
+        self._write(header)
+        game.recorder = self
+        return self
+
+    def close(self):
+        if self.file:
+            self._write([self.game.tick, 'end'])
+            self.file.close()
+            self.file = None
+            self.game.recorder = None
+
+    def _write(self, value):
+        self.file.write(json.dumps(value, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def log_settings(self, game):
+        "Log the game's settings if they have changed."
+        settings = game_settings(game)
+        if settings != self.settings:
+            self.settings = settings
+            self._write([game.tick, 'settings', settings])
+
+    def log_command(self, actor, name, args):
+        # settings changed since the last tick came first
+        self.log_settings(self.game)
+        target = 'p' if actor is self.game.player else actor.id
+        self._write([self.game.tick, 'cmd', target, name, list(args)])
+
+    def before_step(self, game, gui):
+        size = [game.width, game.height]
+        if size != self.size:
+            self.size = size
+            self._write([game.tick, 'size'] + size)
+        self.log_settings(game)
+        if game.tick % self.hash_every == 0:
+            self._write([game.tick, 'hash', state_hash(game)])
+
+def load_log(path):
+    """Returns (header, events) from a log file."""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get('spes_log') != LOG_VERSION:
+            raise ValueError('{} is not a version {} SPES log'.format(path, LOG_VERSION))
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+def apply_command(game, event):
+    target, name, args = event[2], event[3], event[4]
+    actor = game.player if target == 'p' else game.actors.get(target)
+    if actor is None:
+        raise ReplayMismatch('tick {}: no actor with id {} for {}()'.format(
+            event[0], target, name))
+    getattr(actor, name)(*args)
+
+def replay(path, check=True, until_tick=None):
+    """Re-run a recorded game headlessly, as fast as possible.
+
+    If check is True the state hashes in the log are verified and
+    ReplayMismatch is raised at the first one which differs.
+
+    Returns a dict like headless.fast_forward(), with the extra key
+    hashes_checked.
+    """
+    header, events = load_log(path)
+    game = Game(seed=header['seed'])
+    # logs from before the broadphase was recorded were all played on the grid
+    game.broadphase = header.get('broadphase', 'grid')
+    apply_settings(game, header)
+    game.player.quiet_mode = True
+    gui = HeadlessGUI()
+    game.setup(gui)
+    end = max([e[0] for e in events] + [0])
+    if until_tick is not None:
+        end = min(end, until_tick)
+    checked = 0
+    i = 0
+    start = perf_counter()
+    while game.tick <= end:
+        # everything stamped with this tick happened before it was stepped
+        while i < len(events) and events[i][0] == game.tick:
+            event = events[i]
+            kind = event[1]
+            if kind == 'size':
+                gui.width, gui.height = event[2], event[3]
+                game.resize(gui.width, gui.height)
+            elif kind == 'settings':
+                apply_settings(game, event[2])
+            elif kind == 'cmd':
+                apply_command(game, event)
+            elif kind == 'hash' and check:
+                if state_hash(game) != event[2]:
+                    raise ReplayMismatch('state differs from recording at tick {}'.format(game.tick))
+                checked += 1
+            i += 1
+        if game.tick == end:
+            break
+        game.iterate_loop(gui)
+    elapsed = perf_counter() - start
+    return {'ticks': game.tick,
+            'seconds': elapsed,
+            'ticks_per_second': game.tick / elapsed if elapsed > 0 else 0.0,
+            'score': game.player.score,
+            'hashes_checked': checked}
+
+###################### TOP LEVEL USER INTERFACE ######################
+
+if __name__ == '__main__':
+    result = replay(sys.argv[1])
+    print(format_result(result))
+    print('hashes checked: {}'.format(result['hashes_checked']))
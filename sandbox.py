@@ -0,0 +1,287 @@
+# SPES: Starship Programming Edutainment System --- USER CODE RUNNER
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Runs code typed by the player without letting it freeze the game.
+#
+# Each piece of code is compiled (once - compiled code is cached by a hash of
+# its source) into a generator function with a checkpoint at the top of every
+# loop. The game loop steps the resulting "programs" a little at a time, each
+# frame, until that frame's time budget is used up. So a long loop is spread
+# over many frames, and even an infinite loop just keeps running in the
+# background until it is stopped with stop_all().
+#
+# Player code can also say 'yield' on its own to wait for the next frame:
+#
+#     for deg in range(0, 360, 15):
+#         p.missile(deg)
+#         yield
+#
+# Code which never reaches a checkpoint - e.g. a loop inside a function the
+# player has defined - is stopped with TimeBudgetExceeded once it has run for
+# hard_limit seconds. That is a BaseException, so 'except Exception' doesn't
+# stop it - and every except and finally block in player code starts by
+# checking the time, so neither does a bare 'except'.
+#
+# NOTE: this keeps the game responsive, it is NOT a security sandbox. Code run
+# here can do anything that Python can.
+
+import ast
+import hashlib
+import sys
+import traceback
+from collections import OrderedDict
+from time import perf_counter
+
+FILENAME = '<spes>'
+
+class TimeBudgetExceeded(BaseException):
+    """Player code ran for too long without reaching a checkpoint.
+
+    Not an Exception, so that player code catching Exception lets it through.
+    """
+    pass
+
+class Checkpoint(object):
+    """Yielded at the top of each loop iteration - carry on if there is time."""
+
+    def __repr__(self):
+        return 'CHECKPOINT'
+
+CHECKPOINT = Checkpoint()
+
+############################# COMPILING ##############################
+
+class _CheckpointInserter(ast.NodeTransformer):
+    """Puts 'yield __checkpoint__' at the top of every loop body, except
+    inside functions and classes defined by the code."""
+
+    def visit_FunctionDef(self, node):
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+    visit_Lambda = visit_FunctionDef
+
+    def visit_loop(self, node):
+        self.generic_visit(node)
+        checkpoint = ast.Expr(ast.Yield(ast.Name('__checkpoint__', ast.Load())))
+        node.body.insert(0, ast.copy_location(checkpoint, node.body[0]))
+        return node
+
+    visit_For = visit_loop
+    visit_While = visit_loop
+
+class _TimeCheckInserter(ast.NodeTransformer):
+    """Puts '__check_time__()' at the top of every except and finally block,
+    including those inside functions, so that player code can't swallow
+    TimeBudgetExceeded and carry on."""
+
+    def _check(self, node):
+        check = ast.Expr(ast.Call(ast.Name('__check_time__', ast.Load()), [], []))
+        return ast.copy_location(check, node)
+
+    def visit_ExceptHandler(self, node):
+        self.generic_visit(node)
+        node.body.insert(0, self._check(node.body[0]))
+        return node
+
+    def visit_Try(self, node):
+        self.generic_visit(node)
+        if node.finalbody:
+            node.finalbody.insert(0, self._check(node.finalbody[0]))
+        return node
+
+    visit_TryStar = visit_Try
+
+class _AssignedNames(ast.NodeVisitor):
+    """Collects the names bound by top level code, so that they can be
+    declared global and persist between runs as they would with exec()."""
+
+    def __init__(self):
+        self.names = set()
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.names.add(node.id)
+
+    def visit_FunctionDef(self, node):
+        self.names.add(node.name)
+        # decorators and defaults are evaluated in the enclosing scope
+        for expr in node.decorator_list + node.args.defaults:
+            self.visit(expr)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self.names.add(node.name)
+        for expr in node.decorator_list + node.bases:
+            self.visit(expr)
+
+    def visit_Lambda(self, node):
+        pass
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.names.add((alias.asname or alias.name).split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            self.names.add(alias.asname or alias.name)
+
+    def visit_Global(self, node):
+        self.names.update(node.names)
+
+def compile_program(source):
+    """Compile source into code which defines a generator function __program__."""
+    tree = ast.parse(source, FILENAME)
+    collector = _AssignedNames()
+    for stmt in tree.body:
+        collector.visit(stmt)
+    _CheckpointInserter().visit(tree)
+    _TimeCheckInserter().visit(tree)
+    # the 'if False: yield' makes it a generator even if it has no loops
+    wrapper = ast.parse('def __program__():\n    if False: yield\n', FILENAME)
+    func = wrapper.body[0]
+    prologue = [ast.Global(names=sorted(collector.names))] if collector.names else []
+    func.body = prologue + tree.body + func.body
+    ast.fix_missing_locations(wrapper)
+    return compile(wrapper, FILENAME, 'exec')
+
+############################## RUNNING ###############################
+
+class Program(object):
+    """A piece of player code which is part way through running."""
+
+    def __init__(self, source, generator):
+        self.source = source
+        self.generator = generator
+
+    def __repr__(self):
+        first_line = self.source.strip().split('\n')[0]
+        return '<Program: {}>'.format(first_line[:40])
+
+class CodeRunner(object):
+    """Runs player code in a namespace of its own, a little each frame.
+
+    namespace: dict of names the code can use, e.g. p, game, user
+    budget: seconds of player code to run per call to run()
+    hard_limit: seconds code may run without reaching a checkpoint - about
+    a frame, so that even a runaway loop only holds up one
+    """
+
+    def __init__(self, namespace=None, budget=0.005, hard_limit=0.02, cache_size=256):
+        self.namespace = namespace if namespace is not None else {}
+        self.namespace['__checkpoint__'] = CHECKPOINT
+        self.namespace['__check_time__'] = self._check_time
+        self.budget = budget
+        self.hard_limit = hard_limit
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.programs = []
+        self.hard_deadline = 0
+        # set once the program being stepped has run out of time
+        self.expired = False
+        # counters
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def compile(self, source):
+        """Returns compiled code for source, from the cache if possible."""
+        key = hashlib.sha1(source.encode()).hexdigest()
+        code = self.cache.get(key)
+        if code is None:
+            self.cache_misses += 1
+            code = self.cache[key] = compile_program(source)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+        return code
+
+    def submit(self, source):
+        """Queue source to start running on the next call to run().
+
+        Raises SyntaxError straight away if the code can't be compiled.
+        """
+        exec(self.compile(source), self.namespace)
+        program = Program(source, self.namespace.pop('__program__')())
+        self.programs.append(program)
+        return program
+
+    def stop_all(self):
+        "Stop every running program."
+        for program in self.programs:
+            program.generator.close()
+        self.programs = []
+
+    def run(self, budget=None):
+        """Step the running programs in turn until the time budget is used.
+
+        A program which yields anything other than a checkpoint is done for
+        this call. Programs which finish or raise an error are dropped - errors
+        are printed.
+
+        Returns the number of programs still running.
+        """
+        if not self.programs:
+            return 0
+        deadline = perf_counter() + (self.budget if budget is None else budget)
+        active = list(self.programs)
+        old_trace = sys.gettrace()
+        sys.settrace(self._trace_calls)
+        try:
+            while active:
+                for program in list(active):
+                    self.hard_deadline = perf_counter() + self.hard_limit
+                    self.expired = False
+                    try:
+                        value = next(program.generator)
+                    except StopIteration:
+                        self._drop(program, active)
+                        continue
+                    except (Exception, TimeBudgetExceeded):
+                        traceback.print_exc()
+                        self._drop(program, active)
+                        # Python stops tracing when the trace function raises
+                        sys.settrace(self._trace_calls)
+                        continue
+                    if value is not CHECKPOINT:
+                        # asked to wait for the next frame
+                        active.remove(program)
+                if perf_counter() >= deadline:
+                    break
+        finally:
+            sys.settrace(old_trace)
+        return len(self.programs)
+
+    def _drop(self, program, active):
+        active.remove(program)
+        self.programs.remove(program)
+
+    def _trace_calls(self, frame, event, arg):
+        # only trace the player's own code, not the engine code it calls
+        if frame.f_code.co_filename == FILENAME:
+            # loops in functions have no checkpoints, and a one line loop
+            # has no line events - so watch every opcode
+            if frame.f_code.co_name != '__program__':
+                frame.f_trace_opcodes = True
+            return self._trace_lines
+        return None
+
+    def _trace_lines(self, frame, event, arg):
+        if perf_counter() > self.hard_deadline:
+            self.expired = True
+            self._check_time()
+        return self._trace_lines
+
+    def _check_time(self):
+        # also called from player code's except and finally blocks
+        if self.expired:
+            raise TimeBudgetExceeded('code ran for more than {}s without a checkpoint'.format(
+                self.hard_limit))
@@ -0,0 +1,175 @@
+# SPES: Starship Programming Edutainment System --- SNAPSHOTS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Checkpoints of a game's state, to go back to and try something different.
+#
+# The game keeps a snapshot every Game.snapshot_every ticks, in a ring of the
+# last Game.max_snapshots. From the REPL or the editor:
+#
+#     game.rewind(100)          # back to the last snapshot at least 100 ticks ago
+#     s = game.snapshot()       # take one now...
+#     game.restore(s)           # ...and go back to it, as often as you like
+#     game.restore()            # back to the latest snapshot
+#
+# A snapshot covers the actors, the jobs waiting to run, scores and the state
+# of the random number generator - so carrying on from a restored snapshot
+# with the same commands goes exactly the same way. Player code which is
+# running in the editor carries on from where it is, and so do the settings
+# only it changes, such as names and edge behaviours.
+#
+# Snapshots are cheap to take. The actor objects themselves are shared with
+# the game: a snapshot holds references to them, with their positions packed
+# into one array and their other saved attributes (Actor.saved_attrs) in a
+# tuple each. Restoring writes those back into the same objects.
+
+from collision import SpatialHash
+
+from array import array
+from copy import copy
+from operator import attrgetter, countOf
+
+_position = attrgetter('_position')
+# actor class -> function returning the saved attributes of an actor as a tuple
+_getters = {}
+
+def _getter(cls):
+    get = _getters.get(cls)
+    if get is None:
+        get = attrgetter(*cls.saved_attrs)
+        if cls.copied_attrs:
+            copied = [name in cls.copied_attrs for name in cls.saved_attrs]
+            plain = get
+
+            def get(actor):
+                return tuple(copy(v) if c else v for v, c in zip(plain(actor), copied))
+        _getters[cls] = get
+    return get
+
+def _positions(actors):
+    "Returns the positions of actors packed into one array of x, y pairs."
+    positions = array('d')
+    try:
+        # positions are normally array('d')s, which can be joined in one go
+        data = b''.join(map(_position, actors))
+    except TypeError:
+        # some actor keeps its position in a list or tuple
+        data = None
+    if data is not None and len(data) == positions.itemsize * 2 * len(actors):
+        positions.frombytes(data)
+    else:
+        for p in map(_position, actors):
+            positions.append(p[0])
+            positions.append(p[1])
+    return positions
+
+def _by_class(actors):
+    "Returns {class: [actor...]}, without a loop in Python if they are all one class."
+    cls = type(actors[0])
+    if countOf(map(type, actors), cls) == len(actors):
+        return {cls: actors}
+    groups = {}
+    for a in actors:
+        groups.setdefault(type(a), []).append(a)
+    return groups
+
+class Snapshot(object):
+    """The state of a game between two ticks."""
+
+    def __init__(self, game):
+        registry = game.actors
+        self.tick = game.tick
+        self.random_state = game.random.getstate()
+        self.next_id = registry.next_id
+        self.actors = list(registry)
+        self.awake = tuple(registry.awake)
+        self.sleeping = tuple(registry.sleeping)
+        self.actors_to_add = list(game.actors_to_add)
+        # dead projectiles waiting to be recycled - which is recycled next
+        # decides the ids of those to come. Nothing else about them is kept:
+        # reset() sets it all afresh when they are recycled
+        self.pool = {cls: list(free) for cls, free in game.pool.items()}
+        # saved attributes and positions, a class of actor at a time
+        self.groups = []
+        buckets = [list(bucket.values()) for bucket in registry.by_kind.values()]
+        buckets.append(self.actors_to_add)
+        for bucket in buckets:
+            if bucket:
+                for cls, actors in _by_class(bucket).items():
+                    self.groups.append((cls, actors, list(map(_getter(cls), actors)),
+                                        _positions(actors)))
+        # the job heap's entries are tuples, so can be shared - but a job's
+        # steps change as it is rescheduled
+        jobs = game.jobs
+        self.jobs = list(jobs.heap)
+        self.job_steps = [entry[2].steps for entry in self.jobs]
+        self.job_count = jobs.count
+        self.job_next_tick = jobs.next_tick
+
+    def __repr__(self):
+        return '<Snapshot: tick {}, {} actors>'.format(self.tick, len(self.actors))
+
+def restore(game, snap):
+    """Put game back into the state it was in when snap was taken."""
+    gui = game.gui
+    batched = game.physics is not None
+    if batched:
+        game.use_batch_physics(False)
+    in_registry = set(map(id, snap.actors))
+    in_pool = set(id(a) for free in snap.pool.values() for a in free)
+    # canvas items: hide those of actors going back into the pool, delete
+    # those of actors not in the snapshot at all
+    for a in game.actors:
+        if id(a) in in_pool:
+            a.hide_gui(gui)
+        elif id(a) not in in_registry:
+            a.dispose_gui(gui)
+    for free in game.pool.values():
+        for a in free:
+            if id(a) not in in_registry and id(a) not in in_pool:
+                a.dispose_gui(gui)
+    # put the saved attributes back
+    for cls, actors, values, positions in snap.groups:
+        names = cls.saved_attrs
+        copied = cls.copied_attrs
+        for i, a in enumerate(actors):
+            a.asleep = False
+            for name, value in zip(names, values[i]):
+                setattr(a, name, copy(value) if name in copied else value)
+            a.place(positions[2 * i], positions[2 * i + 1])
+            a.restored()
+    for free in snap.pool.values():
+        for a in free:
+            a.is_live = False
+            a.dying = False
+            a.asleep = False
+            a.restored()
+    game.actors.restore(snap.actors, snap.awake, snap.sleeping, snap.next_id)
+    game.actors_to_add = list(snap.actors_to_add)
+    game.pool = {cls: list(free) for cls, free in snap.pool.items()}
+    # sleeping actors are filed in the static collision grid
+    game.static_hash = SpatialHash(game.grid_cell_size)
+    game.num_static = 0
+    for a in game.actors.sleeping.values():
+        if a.kind in game.collision_kinds:
+            game.static_hash.insert(a)
+            game.num_static += 1
+    # show the rest where they were - create_gui reuses existing items
+    for a in snap.actors:
+        a.create_gui(gui)
+    # jobs
+    jobs = game.jobs
+    jobs.heap = list(snap.jobs)
+    for entry, steps in zip(jobs.heap, snap.job_steps):
+        entry[2].steps = steps
+    jobs.count = snap.job_count
+    jobs.next_tick = snap.job_next_tick
+    game.random.setstate(snap.random_state)
+    game.tick = snap.tick
+    if batched:
+        game.use_batch_physics(True)
+    game.full_redraw = True
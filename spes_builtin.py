@@ -12,6 +12,9 @@
 # executed.
 #
 # Code in editor can also be saved and loaded from file.
+#
+# Code is run a little at a time by the game loop (see sandbox.py), so that a
+# long or endless loop can't freeze the game - press 'stop' to end it.
 
 # RUNNING THE GAME:
 #
@@ -20,13 +23,28 @@
 # Just run the file spes_builtin.py:
 #
 #     $ python spes_builtin.py
+#
+# To record the game, for replaying with replay.py:
+#
+#     $ python spes_builtin.py --record match.log
+#
+# To draw each frame as one image, which keeps big matches smooth:
+#
+#     $ python spes_builtin.py --raster
 
 from engine import Game
+from headless import HeadlessCanvas
+from loop import FixedStepScheduler
+from renderer import RasterRenderer
+from replay import Recorder
+from sandbox import CodeRunner
 import user
 
 import tkinter as tk
 import tkinter.filedialog as filedialog
 import importlib
+import sys
+import traceback
 
 class GameGUI(object):
     """Public interface:
@@ -35,19 +53,36 @@ class GameGUI(object):
     get_height()
     get_canvas()
     set_info_text(text)
+    renderer - a renderer.RasterRenderer, or None to draw with canvas items
     """
 
     game_running = True
     engine = None
     restart_with_game_engine = None
+    renderer = None
+
+    # ticks between counts of canvas items for the info text
+    item_count_every = 60
 
-    def __init__(self):
+    def __init__(self, raster=False):
+        self.scheduler = FixedStepScheduler()
+        self.runner = CodeRunner()
         self.root = tk.Tk()
         self.root.title("game")
         # canvas
-        self.canvas = tk.Canvas(self.root, bg='blue', width=800, height=600)
+        self.width = 800
+        self.height = 600
+        self.canvas = tk.Canvas(self.root, bg='blue', width=self.width, height=self.height)
         self.info = self.canvas.create_text(10, 20, anchor=tk.NW, text="info", fill="white")
+        self.canvas.bind('<Configure>', self.on_resize)
         self.canvas.grid()
+        if raster:
+            self.renderer = RasterRenderer(self.canvas, self.width, self.height)
+            # actors' own canvas items go nowhere
+            self.actor_canvas = HeadlessCanvas()
+        else:
+            self.actor_canvas = self.canvas
+        self.num_items = 0
         # editor
         self.editor = tk.Text(self.root, height=10, bg='black', fg='cyan', insertbackground='white')
         self.editor.grid()
@@ -66,11 +101,14 @@ class GameGUI(object):
         self.exec_sel_button.grid(row=0, column=4)
         self.exec_line_button = tk.Button(self.control_panel, text='exec line (Ctrl-l)', command=self.exec_current_line)
         self.exec_line_button.grid(row=0, column=5)
+        self.stop_button = tk.Button(self.control_panel, text='stop', command=self.runner.stop_all)
+        self.stop_button.grid(row=0, column=6)
         self.control_panel.grid()
 
     def setup_game_engine(self, engine):
         self.engine = engine
         self.engine.setup(self)
+        self.runner.namespace.update(game=engine, p=engine.player)
 
     def restart_game(self):
         game = Game()
@@ -92,33 +130,36 @@ class GameGUI(object):
             self.editor.delete(1.0, tk.END)
             self.editor.insert(tk.END, f.read())
 
+    def run_code(self, text):
+        "Start running text in the game loop, reporting syntax errors at once."
+        try:
+            self.runner.submit(text)
+        except SyntaxError:
+            traceback.print_exc()
+
     def exec_text(self):
-        # global text
-        # global root
-        # global canv
-        global p
         text = self.editor.get("1.0", "end-1c")
-        exec(text)
+        self.run_code(text)
 
     def exec_selected_text(self):
-        # global text
-        # global root
-        # global canv
-        global p
         text = self.editor.get(tk.SEL_FIRST, tk.SEL_LAST)
-        exec(text)
+        self.run_code(text)
 
     def exec_current_line(self):
-        # global text
-        # global root
-        # global canv
-        global p
         text = self.editor.get("insert linestart", "insert lineend")
-        exec(text)
+        self.run_code(text)
 
     def typed_exec_line(self, event):
         self.exec_current_line()
 
+    def on_resize(self, event):
+        # canvas size is cached here and in the game, rather than asked of Tk every tick
+        self.width = event.width
+        self.height = event.height
+        self.engine.resize(self.width, self.height)
+        if self.renderer:
+            self.renderer.resize(self.width, self.height)
+
     def game_loop(self):
 
         if self.restart_with_game_engine:
@@ -126,43 +167,58 @@ class GameGUI(object):
             global p
             game = self.restart_with_game_engine
             self.restart_with_game_engine = None
-            self.canvas.delete(tk.ALL)
+            if not self.renderer:
+                self.canvas.delete(tk.ALL)
             self.setup_game_engine(game)
             p = game.player
 
-        self.engine.iterate_loop(self)
+        # player code gets a fixed slice of each frame
+        self.runner.run()
+        self.scheduler.advance(self.engine, self)
         if self.game_running:
-            self.root.after(50, self.game_loop)
+            self.root.after(self.scheduler.next_delay_ms(), self.game_loop)
         else:
             # stop thread and dispose of GUI
+            if self.engine.recorder:
+                self.engine.recorder.close()
             print('Goodbye!\n')
             self.root.destroy()
 
     #### PUBLIC INTERFACE ####
 
     def get_width(self):
-        return self.canvas.winfo_width()
+        return self.width
 
     def get_height(self):
-        return self.canvas.winfo_height()
+        return self.height
 
     def get_canvas(self):
-        return self.canvas
+        return self.actor_canvas
 
     def set_info_text(self, text):
-        debug_text = 'num canvas items: {}\n'.format(len(self.canvas.find_all()))
-        self.canvas.itemconfig(self.info, text=debug_text + text)
+        # counting canvas items is a Tk call, so only do it now and then
+        if self.engine.tick % self.item_count_every == 0:
+            self.num_items = len(self.canvas.find_all())
+        debug_text = 'num canvas items: {}\nprograms running: {}\n'.format(
+            self.num_items, len(self.runner.programs))
+        self.canvas.itemconfig(self.info, text=self.scheduler.info_text() + debug_text + text)
 
 ###################### TOP LEVEL USER INTERFACE ######################
 
 game = Game()
-gui = GameGUI()
+gui = GameGUI(raster='--raster' in sys.argv)
 gui.setup_game_engine(game)
 p = game.player
 
+if '--record' in sys.argv:
+    Recorder(sys.argv[sys.argv.index('--record') + 1]).attach(game)
+
 def update():
     print('updating from user file...')
     importlib.reload(user)
 
+# names which code in the editor can use
+gui.runner.namespace.update(gui=gui, user=user, update=update)
+
 gui.root.after(500, gui.game_loop)
 gui.root.mainloop()
@@ -31,13 +31,41 @@
 # 3: Start the game GUI running:
 #
 #     >>> gui.start()
+#
+# To draw each frame as one image, which keeps big matches smooth, start with:
+#
+#     $ python -i spes_cmd.py --raster
+#
+# Or to draw in a separate process, so that drawing and the game each get a
+# core of their own (see render_process.py):
+#
+#     $ python -i spes_cmd.py --render-process
+
+# COMMANDS FROM THE INTERPRETER:
+#
+# Ship commands typed at the interpreter are queued and run by the game thread
+# at the start of its next tick, so they never race with the game loop. Each
+# returns a Pending which can be waited for, or awaited in asyncio code:
+#
+#     >>> p.move(90, 200).wait()
+#
+#     >>> async def square():
+#     ...     for angle in (0, 90, 180, 270):
+#     ...         await p.move(angle, 100)
+#     >>> spawn(square())
 
 from engine import Game
+from commands import CommandQueue, Pending, spawn
+from headless import HeadlessCanvas
+from loop import FixedStepScheduler
+from render_process import ProcessGUI
+from renderer import RasterRenderer
+from replay import Recorder
 import user
 
 import tkinter as tk
+import sys
 import threading
-from time import time
 from random import randint
 import importlib
 
@@ -50,24 +78,39 @@ class GameGUI(threading.Thread):
     get_height()
     get_canvas()
     set_info_text(text)
+    renderer - a renderer.RasterRenderer, or None to draw with canvas items
     """
 
     game_running = True
     restart_with_game_engine = None
-    iteration_time = time()
-    fps = 0
-
-    def __init__(self, engine):
+    width = 800
+    height = 800
+    # ticks between counts of canvas items for the info text
+    item_count_every = 60
+    num_items = 0
+    renderer = None
+
+    def __init__(self, engine, raster=False):
         threading.Thread.__init__(self)
         self.engine = engine
+        self.raster = raster
+        self.scheduler = FixedStepScheduler()
 
     def run(self):
         # on thread starting
+        self.engine.commands.claim()
         self.root = tk.Tk()
         self.root.title("game")
-        self.canvas = tk.Canvas(self.root, bg='blue', width=800, height=800)
+        self.canvas = tk.Canvas(self.root, bg='blue', width=self.width, height=self.height)
+        self.canvas.bind('<Configure>', self.on_resize)
         self.canvas.pack()
         self.info = self.canvas.create_text(10, 20, anchor=tk.NW, text="info", fill="white")
+        if self.raster:
+            self.renderer = RasterRenderer(self.canvas, self.width, self.height)
+            # actors' own canvas items go nowhere
+            self.actor_canvas = HeadlessCanvas()
+        else:
+            self.actor_canvas = self.canvas
         self.engine.setup(self)
         # start the GUI and game-loop
         self.root.after(500, self.game_loop)
@@ -76,24 +119,32 @@ class GameGUI(threading.Thread):
     def game_loop(self):
 
         if self.restart_with_game_engine:
-            self.canvas.delete(tk.ALL)
+            if not self.renderer:
+                self.canvas.delete(tk.ALL)
+            # commands already queued go to the new game
+            self.restart_with_game_engine.commands = self.engine.commands
             self.engine = self.restart_with_game_engine
             self.restart_with_game_engine = None
             self.engine.setup(self)
 
-        self.engine.iterate_loop(self)
+        self.scheduler.advance(self.engine, self)
         if self.game_running:
-            self.root.after(50, self.game_loop)
-            # calculate fps
-            last_time = self.iteration_time
-            self.iteration_time = time()
-            elapsed = self.iteration_time - last_time
-            self.fps = 1.0 / elapsed
+            self.root.after(self.scheduler.next_delay_ms(), self.game_loop)
         else:
             # stop thread and dispose of GUI
+            if self.engine.recorder:
+                self.engine.recorder.close()
             print('Goodbye!\n')
             self.root.destroy()
 
+    def on_resize(self, event):
+        # canvas size is cached here and in the game, rather than asked of Tk every tick
+        self.width = event.width
+        self.height = event.height
+        self.engine.resize(self.width, self.height)
+        if self.renderer:
+            self.renderer.resize(self.width, self.height)
+
     def new_game(self, engine):
         self.new_game_engine = engine
 
@@ -103,27 +154,50 @@ class GameGUI(threading.Thread):
     #### PUBLIC INTERFACE ####
 
     def get_width(self):
-        return self.canvas.winfo_width()
+        return self.width
 
     def get_height(self):
-        return self.canvas.winfo_height()
+        return self.height
 
     def get_canvas(self):
-        return self.canvas
+        return self.actor_canvas
 
     def set_info_text(self, text):
-        fps_str = 'fps: {:.2f}\n'.format(self.fps)
-        debug_str = 'num canvas items: {}\n'.format(len(self.canvas.find_all()))
+        fps_str = self.scheduler.info_text()
+        # counting canvas items is a Tk call, so only do it now and then
+        if self.engine.tick % self.item_count_every == 0:
+            self.num_items = len(self.canvas.find_all())
+        debug_str = 'num canvas items: {}\n'.format(self.num_items)
         self.canvas.itemconfig(self.info, text=fps_str + debug_str + text)
 
 ###################### TOP LEVEL USER INTERFACE ######################
 
 game = Game()
-gui = GameGUI(game)
+game.commands = CommandQueue()
+if '--render-process' in sys.argv:
+    gui = ProcessGUI(game)
+else:
+    gui = GameGUI(game, raster='--raster' in sys.argv)
 p = game.player
 
 def update():
     print('updating from user file...')
     importlib.reload(user)
 
-print('game initialised... to start, type: gui.start()')
+def record(path):
+    """Record the game to path, for replaying with: python replay.py path
+
+    Must be called before gui.start()
+    """
+    return Recorder(path).attach(game)
+
+def displayhook(value):
+    "Don't echo the Pending returned by every ship command."
+    if not isinstance(value, Pending):
+        sys.__displayhook__(value)
+
+sys.displayhook = displayhook
+
+# not when imported by the render process as it starts up
+if __name__ == '__main__':
+    print('game initialised... to start, type: gui.start()')
@@ -0,0 +1,157 @@
+# SPES: Starship Programming Edutainment System --- COLLISION TESTS
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Checks the collision geometry against brute force sampling:
+#
+#     $ python -m unittest test_collision
+#     $ python -m pytest test_collision.py
+
+import unittest
+
+from collision import convex_hull, hull_axes, convex_shapes_overlap, convex_shapes_sweep
+from engine import Game, Ship, Bullet, sin_cos, rotation_cache
+from headless import HeadlessGUI
+
+# as in Ship.__init__
+SHIP = (10, -15, 0, 15, -10, -15)
+
+def square(size):
+    hull = convex_hull([size, size, size, -size, -size, -size, -size, size])
+    return hull, hull_axes(hull)
+
+class SweepTest(unittest.TestCase):
+
+    def test_passing_through_is_caught(self):
+        hull, axes = square(3)
+        # 40 along in one go - the end positions are well clear of each other
+        t = convex_shapes_sweep(hull, axes, 0, 0, hull, axes, 20, 0, 40, 0)
+        self.assertIsNotNone(t)
+        self.assertAlmostEqual(t, 14 / 40)
+
+    def test_passing_by_is_not(self):
+        hull, axes = square(3)
+        self.assertIsNone(convex_shapes_sweep(hull, axes, 0, 0, hull, axes, 20, 7, 40, 0))
+
+    def test_already_touching(self):
+        hull, axes = square(3)
+        self.assertEqual(convex_shapes_sweep(hull, axes, 0, 0, hull, axes, 5, 0, 0, 10), 0.0)
+
+    def test_agrees_with_sampling(self):
+        ship = rotation_cache.get(SHIP, 35)
+        bullet, bullet_axes = square(3)
+        for dx, dy in ((40, 0), (0, -40), (28, 28), (-33, 17)):
+            for off in range(-30, 31, 3):
+                x, y = -dx / 2 + off * 0.7, -dy / 2 - off * 0.7
+                sampled = any(convex_shapes_overlap(bullet, bullet_axes, x + dx * i / 400, y + dy * i / 400,
+                                                    ship.hull, ship.axes, 0, 0)
+                              for i in range(401))
+                swept = convex_shapes_sweep(bullet, bullet_axes, x, y, ship.hull, ship.axes, 0, 0, dx, dy)
+                self.assertEqual(swept is not None, sampled, (dx, dy, off))
+
+class GrazingBulletTest(unittest.TestCase):
+    """Bullets fired past rotated ships should kill them exactly when their
+    shapes touch somewhere along the path - whichever broadphase is used."""
+
+    gui = HeadlessGUI(1000, 1000)
+
+    def shoot(self, broadphase, rotation, direction, offset):
+        game = Game(seed=0)
+        game.broadphase = broadphase
+        game.num_drones = 0
+        game.player.quiet_mode = True
+        game.setup(self.gui)
+        game.player.place(50, 950)
+        ship = Ship(game, 'grey')
+        ship.place(500, 500)
+        ship.rotate(rotation)
+        game.add_actor(ship)
+        s, c = sin_cos(direction)
+        # bullets start 30 in front of where they are fired from
+        bullet = Bullet(game, 500 - s * 180 + c * offset, 500 - c * 180 - s * offset,
+                        direction, game.player)
+        game.add_actor(bullet)
+        start = tuple(bullet.position)
+        for i in range(36):
+            game.iterate_loop(self.gui)
+        return ship, start
+
+    def touches(self, ship, start, direction):
+        rs = ship.rotated
+        bullet, bullet_axes = square(3)
+        s, c = sin_cos(direction)
+        return any(convex_shapes_overlap(rs.hull, rs.axes, 500, 500, bullet, bullet_axes,
+                                         start[0] + s * d / 4, start[1] + c * d / 4)
+                   for d in range(36 * 10 * 4))
+
+    def test_sap_kills_exactly_when_shapes_touch(self):
+        for rotation in (20, 45, 160):
+            for direction in range(0, 360, 60):
+                for offset in range(-24, 25, 4):
+                    ship, start = self.shoot('sap', rotation, direction, offset)
+                    self.assertEqual(ship.dying or not ship.is_live,
+                                     self.touches(ship, start, direction),
+                                     (rotation, direction, offset))
+
+    def test_grid_and_brute_never_kill_without_touching(self):
+        for broadphase in ('grid', 'brute'):
+            for direction in range(0, 360, 60):
+                for offset in range(-24, 25, 4):
+                    ship, start = self.shoot(broadphase, 45, direction, offset)
+                    if ship.dying or not ship.is_live:
+                        self.assertTrue(self.touches(ship, start, direction),
+                                        (broadphase, direction, offset))
+
+class StillActorTest(unittest.TestCase):
+    """An actor which stands still should still be hit by one placed on top of
+    it, even though it goes to sleep."""
+
+    gui = HeadlessGUI(1000, 1000)
+
+    def test_placing_onto_a_parked_ship_kills_both(self):
+        for broadphase in ('sap', 'grid', 'brute'):
+            game = Game(seed=0)
+            game.broadphase = broadphase
+            game.num_drones = 0
+            game.player.quiet_mode = True
+            game.setup(self.gui)
+            game.player.place(50, 950)
+            ship = Ship(game, 'grey')
+            ship.place(500, 500)
+            game.add_actor(ship)
+            game.player.place(500, 500)
+            for i in range(30):
+                game.iterate_loop(self.gui)
+            self.assertTrue(ship.dying or not ship.is_live, broadphase)
+            self.assertTrue(game.player.dying or not game.player.is_live, broadphase)
+
+    def test_writing_position_and_rotation_directly_is_noticed(self):
+        game = Game(seed=0)
+        game.num_drones = 0
+        game.player.quiet_mode = True
+        game.setup(self.gui)
+        p = game.player
+        p.place(500, 500)
+        ship = Ship(game, 'grey')
+        ship.place(300, 300)
+        game.add_actor(ship)
+        for i in range(5):
+            game.iterate_loop(self.gui)
+        self.assertTrue(p.asleep)
+        p.position[0] = 600
+        self.assertEqual(list(p.bbox), [590, 485, 610, 515])
+        p.rotation = 90
+        self.assertEqual(list(p.bbox), [585, 490, 615, 510])
+        for i in range(5):
+            game.iterate_loop(self.gui)
+        p.position[0] = 300
+        p.position[1] = 300
+        game.iterate_loop(self.gui)
+        self.assertTrue(ship.dying or not ship.is_live)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# SPES: Starship Programming Edutainment System --- TOURNAMENT RUNNER
+#
+# author: B. S. Chambers
+# email: ben@bschambers.info
+# website: https://github.com/bschambers/spes
+#
+# Copyright 2019-present B. S. Chambers - Distributed under GPL, version 3
+
+# Scores bot strategies by playing many headless matches in parallel, one per
+# CPU core.
+#
+# A strategy is named as 'module:function', or just 'module' for a module with
+# a function called tick. The function is called once per tick, before the
+# game is stepped, as function(game, p) - see example_bots.py.
+#
+# Every strategy plays one match for each seed. A match ends when the player's
+# ship is destroyed, or after the given number of ticks.
+#
+#     $ python tournament.py example_bots:turret example_bots:wanderer --seeds 1 2 3 --out report
+#
+# writes report.csv (one row per match) and report.json (per-strategy summary
+# plus all the matches).
+
+from engine import Game
+from headless import HeadlessGUI
+
+import argparse
+import csv
+import importlib
+import importlib.util
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+MATCH_FIELDS = ['strategy', 'seed', 'score', 'survived_ticks', 'destroyed',
+                'seconds', 'ticks_per_second']
+
+def load_strategy(spec):
+    """Returns the strategy function for 'module:function', 'module' or 'path.py:function'."""
+    module_name, _, func_name = spec.partition(':')
+    if module_name.endswith('.py'):
+        name = os.path.splitext(os.path.basename(module_name))[0]
+        loader_spec = importlib.util.spec_from_file_location(name, module_name)
+        module = importlib.util.module_from_spec(loader_spec)
+        loader_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(module_name)
+    return getattr(module, func_name or 'tick')
+
+def play_match(spec, seed, ticks=5000, width=800, height=800):
+    """Play one headless match and return a dict of results (see MATCH_FIELDS)."""
+    strategy = load_strategy(spec)
+    game = Game(seed=seed)
+    # nobody is there to rewind
+    game.snapshot_every = 0
+    p = game.player
+    p.quiet_mode = True
+    gui = HeadlessGUI(width, height)
+    game.setup(gui)
+    start = perf_counter()
+    while game.tick < ticks and p.is_live:
+        strategy(game, p)
+        # no need to draw anything
+        game.step(gui)
+    elapsed = perf_counter() - start
+    return {'strategy': spec,
+            'seed': seed,
+            'score': p.score,
+            'survived_ticks': game.tick,
+            'destroyed': not p.is_live,
+            'seconds': elapsed,
+            'ticks_per_second': game.tick / elapsed if elapsed > 0 else 0.0}
+
+def summarise(matches):
+    """Returns a per-strategy summary of a list of match results."""
+    by_strategy = {}
+    for m in matches:
+        by_strategy.setdefault(m['strategy'], []).append(m)
+    summary = {}
+    for spec, ms in by_strategy.items():
+        n = len(ms)
+        summary[spec] = {'matches': n,
+                         'mean_score': sum(m['score'] for m in ms) / n,
+                         'mean_survived_ticks': sum(m['survived_ticks'] for m in ms) / n,
+                         'destroyed': sum(1 for m in ms if m['destroyed']),
+                         'total_seconds': sum(m['seconds'] for m in ms)}
+    return summary
+
+def run_tournament(specs, seeds, ticks=5000, workers=None):
+    """Play every strategy against every seed, spread over a process pool.
+
+    Returns the list of match results, in the order strategies and seeds
+    were given.
+    """
+    # fail early, in this process, if a strategy can't be loaded
+    for spec in specs:
+        load_strategy(spec)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(play_match, spec, seed, ticks)
+                   for spec in specs for seed in seeds]
+        return [f.result() for f in futures]
+
+def write_report(matches, path):
+    """Write path.csv with one row per match and path.json with a summary."""
+    with open(path + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=MATCH_FIELDS)
+        writer.writeheader()
+        writer.writerows(matches)
+    with open(path + '.json', 'w') as f:
+        json.dump({'summary': summarise(matches), 'matches': matches}, f, indent=2)
+
+###################### TOP LEVEL USER INTERFACE ######################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score SPES strategies over many headless matches.')
+    parser.add_argument('strategies', nargs='+', help="'module:function' or 'module' (uses tick)")
+    parser.add_argument('--seeds', nargs='+', type=int, default=list(range(10)))
+    parser.add_argument('--ticks', type=int, default=5000, help='maximum length of each match')
+    parser.add_argument('--workers', type=int, default=None, help='default: one per CPU core')
+    parser.add_argument('--out', default='tournament', help='report file name, without extension')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    matches = run_tournament(args.strategies, args.seeds, args.ticks, args.workers)
+    write_report(matches, args.out)
+    print('{:<30}{:>8}{:>12}{:>14}{:>11}'.format('strategy', 'matches', 'mean score',
+                                                  'mean survival', 'destroyed'))
+    for spec, s in summarise(matches).items():
+        print('{:<30}{:>8}{:>12.1f}{:>14.1f}{:>11}'.format(spec, s['matches'], s['mean_score'],
+                                                          s['mean_survived_ticks'], s['destroyed']))
+    print('{} matches in {:.1f}s - report written to {}.csv and {}.json'.format(
+        len(matches), perf_counter() - start, args.out, args.out))